@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import glob
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+import easypipeline.cogamo as cogamo
+from easypipeline.fileutils import get_file_hash
+
+# version of the archive partitions, increment it when their layout changes
+HK_ARCHIVE_VERSION = 1
+
+def to_yyyymmdd(unixtime):
+	""" JST date of a unixtime, e.g., '20210105' """
+	return str(np.datetime64(int(unixtime + cogamo.JST_OFFSET_SEC),'s').astype('datetime64[D]')).replace('-','')
+
+class HKArchive(object):
+	"""
+	Time-sorted columnar store of the parsed HK files, partitioned by DetID
+	and date: <archive_dir>/<DetID>/<yyyymmdd>/ holds the npy columns of one
+	HK file (cogamo.write_npy_columns) sorted in unixtime. A query selects
+	the partitions of the time window, finds the rows with a binary search
+	on the memory-mapped unixtime column and reads only the requested
+	columns of these rows, without loading the csv files. The time window 
+	is tstart <= unixtime <= tstop, as in cogamo.HKData.
+	"""
+	def __init__(self,archive_dir):
+		self.archive_dir = archive_dir
+
+	def get_partition_path(self,detid,yyyymmdd):
+		return '%s/%s/%s' % (self.archive_dir,detid,yyyymmdd)
+
+	def add_file(self,filepath,cachedir=None):
+		""" parse an HK csv file (or load its cache) and add it to the archive, 
+		unless it is already there. """
+		detid, yyyymmdd = os.path.splitext(os.path.basename(filepath))[0].split('_')
+		meta = cogamo.read_npy_meta(self.get_partition_path(detid,yyyymmdd))
+		if meta is not None and meta.get('version') == HK_ARCHIVE_VERSION \
+				and meta.get('sha256') == get_file_hash(filepath):
+			return False
+		return self.add_data(cogamo.HKData(filepath,cachedir=cachedir))
+
+	def add_data(self,hkdata):
+		""" add an HKData (read with all the columns) to the archive. The
+		partition is replaced only when the source file changed. """
+		if hkdata.columns is not None or hkdata.tstart is not None or hkdata.tstop is not None:
+			raise ValueError('HKData read with a subset of the columns or a time window is not archived.')
+		dirpath = self.get_partition_path(hkdata.detid_str,hkdata.yyyymmdd_jst)
+		sha256 = getattr(hkdata,'sha256',None) # set when read through the cache
+		if sha256 is None:
+			sha256 = get_file_hash(hkdata.filepath)
+		meta = cogamo.read_npy_meta(dirpath)
+		if meta is not None and meta.get('version') == HK_ARCHIVE_VERSION and meta.get('sha256') == sha256:
+			return False
+		df = hkdata.df
+		unixtime = df['unixtime'].to_numpy()
+		if np.any(unixtime[1:] < unixtime[:-1]):
+			df = df.iloc[np.argsort(unixtime,kind='stable')].reset_index(drop=True)
+			unixtime = df['unixtime'].to_numpy()
+		os.makedirs(os.path.dirname(dirpath),exist_ok=True)
+		cogamo.write_npy_columns(dirpath,df,OrderedDict([
+			('version',HK_ARCHIVE_VERSION),('sha256',sha256),('filepath',hkdata.filepath),
+			('tmin',float(unixtime[0]) if len(unixtime) > 0 else None),
+			('tmax',float(unixtime[-1]) if len(unixtime) > 0 else None)]))
+		sys.stdout.write('-- HKArchive: {} added to {}\n'.format(hkdata.filepath,dirpath))
+		return True
+
+	def get_detids(self):
+		return sorted([os.path.basename(path) for path in glob.glob('%s/*' % self.archive_dir) if os.path.isdir(path)])
+
+	def get_dates(self,detid):
+		return sorted([os.path.basename(path) for path in glob.glob('%s/%s/*' % (self.archive_dir,detid))
+			if re.fullmatch(r'\d{8}',os.path.basename(path))])
+
+	def query(self,detid,tstart=None,tstop=None,columns=None):
+		"""
+		Rows of a DetID (or a list of DetIDs, with a "detid" column) in
+		tstart <= unixtime <= tstop, time-sorted. tstart and tstop are JST
+		strings or unixtime (None for no limit), a date-only tstop is the whole
+		day (cogamo.to_unixtime). columns: the columns to be read (None for 
+		all), unixtime is always read. Without rows, the frame has unixtime 
+		and the requested columns.
+		"""
+		names = None if columns is None else ['unixtime'] + [name for name in columns if name != 'unixtime']
+		if not isinstance(detid,str):
+			frames = []
+			for one_detid in detid:
+				df = self.query(one_detid,tstart,tstop,columns)
+				df.insert(0,'detid',one_detid)
+				if len(df) > 0:
+					frames.append(df)
+			if len(frames) == 0:
+				return self.get_empty_frame(['detid'] + (names or ['unixtime']))
+			return pd.concat(frames,ignore_index=True)
+
+		tstart = cogamo.to_unixtime(tstart)
+		tstop = cogamo.to_unixtime(tstop,end_of_day=True)
+		# the partitions of the window (one day of margin) from their names
+		dates = self.get_dates(detid)
+		if tstart is not None:
+			dates = [yyyymmdd for yyyymmdd in dates if yyyymmdd >= to_yyyymmdd(tstart - 86400)]
+		if tstop is not None:
+			dates = [yyyymmdd for yyyymmdd in dates if yyyymmdd <= to_yyyymmdd(tstop + 86400)]
+		frames = []
+		for yyyymmdd in dates:
+			dirpath = self.get_partition_path(detid,yyyymmdd)
+			meta = cogamo.read_npy_meta(dirpath)
+			if meta is None or meta['nrows'] == 0:
+				continue
+			if (tstart is not None and meta['tmax'] < tstart) or (tstop is not None and meta['tmin'] > tstop):
+				continue
+			read_names = meta['columns'] if names is None else names
+			df = cogamo.read_npy_columns(dirpath,columns=read_names,meta=meta)
+			unixtime = df['unixtime'].to_numpy()
+			istart = 0 if tstart is None else np.searchsorted(unixtime,tstart,side='left')
+			istop = len(unixtime) if tstop is None else np.searchsorted(unixtime,tstop,side='right')
+			if istop <= istart:
+				continue
+			# only the selected rows are copied out of the memory-mapped files
+			frames.append(pd.DataFrame(OrderedDict([(name,np.array(df[name].to_numpy()[istart:istop]))
+				for name in read_names if name in df.columns])))
+		if len(frames) == 0:
+			return self.get_empty_frame(names or ['unixtime'])
+		return pd.concat(frames,ignore_index=True)
+
+	def get_empty_frame(self,names):
+		""" result of a query without rows """
+		df = pd.DataFrame(columns=names)
+		return df.astype({'unixtime':np.float64})
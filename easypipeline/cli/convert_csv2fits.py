@@ -2,11 +2,17 @@
 
 import argparse
 
-import os 
-import sys 
-import yaml 
-import pandas as pd 
-from astropy.table import Table
+import os
+import sys
+import re
+import yaml
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+import easypipeline.cogamo as cogamo
+import easypipeline.pipeline as pipeline
+from easypipeline.fitswriter import BinTableWriter, check_tform, get_tform
 
 __author__ = 'Teruaki Enoto'
 __version__ = '0.01'
@@ -14,47 +20,142 @@ __version__ = '0.01'
 def get_parser():
 	parser = argparse.ArgumentParser(
 		prog="convert_csv2fits.py",
-		usage='%(prog)s csvfile',
+		usage='%(prog)s csvfile [csvfile ...]',
 		description="""
-Convert input csvfile to fitsfile.
+Convert input csvfiles (pipeline tables or raw HK files) to fitsfiles.
+The files are read in chunks and streamed into FITS binary tables.
 """	)
-	parser.add_argument('csvfile',metavar='csvfile',type=str, 
-		help='Input csvfile.')
-	parser.add_argument('--column', '-c', type=str, required=False, 
-		help='column name definition yamlfile path')	
+	parser.add_argument('csvfiles',metavar='csvfile',type=str,nargs='+',
+		help='Input csvfiles.')
+	parser.add_argument('--column', '-c', type=str, required=False,
+		help='column name definition yamlfile path (default: formats inferred from the values)')
+	parser.add_argument('--filetype', type=str, default='auto', choices=['auto','table','hk'],
+		help='pipeline table or raw HK csv file (default: auto)')
+	parser.add_argument('--outdir', '-o', type=str, default=None,
+		help='output directory (default: the directory of each csvfile)')
+	parser.add_argument('--merge', '-m', type=str, default=None,
+		help='write all the csvfiles into this single fitsfile')
+	parser.add_argument('--chunksize', type=int, default=100000,
+		help='number of lines read at once (default: 100000)')
 	return parser
 
+def get_filetype(csvfile):
+	""" 'hk' for a raw HK csv file (yyyy-mm-dd,HH:MM:SS,...), else 'table' """
+	with open(csvfile,'rb') as reader:
+		line = reader.readline()
+	return 'hk' if re.match(rb'^\d{4}-\d{2}-\d{2},\d{2}:\d{2}:\d{2},',line) else 'table'
+
+def get_hk_columns():
+	columns = OrderedDict()
+	for name, dtype in cogamo.HK_COLUMNS.items():
+		columns[name] = (get_tform(np.dtype(dtype),cogamo.HK_TIME_WIDTHS.get(name)),cogamo.HK_UNITS.get(name,''))
+	columns['unixtime'] = ('D',cogamo.HK_UNITS['unixtime'])
+	return columns
+
+def read_table_chunks(csvfile,def_column_yaml=None,chunksize=100000):
+	if def_column_yaml is not None:
+		reader = pipeline.read_table_csv(csvfile,def_column_yaml,chunksize=chunksize)
+	else:
+		reader = pd.read_csv(csvfile,index_col=0,na_values=['--'],keep_default_na=False,chunksize=chunksize)
+	for df in reader:
+		df.index.name = 'index'
+		yield df.reset_index()
+
+def scan_table_columns(csvfiles,def_column_yaml=None,chunksize=100000):
+	"""
+	FITS columns of pipeline tables: the formats and units of def_column, with
+	the strings widened to the longest value not to cut them, or the formats
+	inferred from the values. Only the widths and kinds are kept in memory.
+	"""
+	kinds = OrderedDict() # 'b', 'i', 'f' or 'O' (strings)
+	widths = {}
+	for csvfile in csvfiles:
+		for df in read_table_chunks(csvfile,def_column_yaml,chunksize):
+			for name in df.columns:
+				column = df[name]
+				kind = column.dtype.kind if isinstance(column.dtype,np.dtype) else 'O'
+				if kind == 'f':
+					values = column.dropna().to_numpy()
+					if np.all(np.mod(values,1) == 0):
+						kind = 'i' # integers with missing cells
+				previous = kinds.get(name,kind)
+				if previous != kind:
+					kind = 'f' if set([previous,kind]) == set(['i','f']) else 'O'
+				kinds[name] = kind
+				width = column.dropna().astype(str).str.len().max()
+				widths[name] = max(widths.get(name,1),0 if pd.isna(width) else int(width))
+
+	columns = OrderedDict()
+	for name, kind in kinds.items():
+		if name == 'index':
+			columns[name] = ('K','')
+		elif def_column_yaml is not None:
+			repeat, code = check_tform(def_column_yaml[name]['format'])
+			tform = '%dA' % max(repeat,widths[name]) if code == 'A' else def_column_yaml[name]['format']
+			columns[name] = (tform,def_column_yaml[name]['unit'])
+		else:
+			columns[name] = ({'b':'L','i':'K','f':'D'}.get(kind,'%dA' % widths[name]),'')
+	return columns
+
+def convert(csvfiles,outfitsfile,filetype='auto',def_column_yaml=None,chunksize=100000):
+	if filetype == 'auto':
+		filetypes = set([get_filetype(csvfile) for csvfile in csvfiles])
+		if len(filetypes) > 1:
+			raise ValueError('pipeline tables and raw HK files can not be merged.')
+		filetype = filetypes.pop()
+
+	if filetype == 'hk':
+		columns = get_hk_columns()
+		read_chunks = lambda csvfile: cogamo.read_hk_chunks(csvfile,chunksize=chunksize)
+	else:
+		columns = scan_table_columns(csvfiles,def_column_yaml,chunksize)
+		read_chunks = lambda csvfile: read_table_chunks(csvfile,def_column_yaml,chunksize)
+
+	if os.path.exists(outfitsfile):
+		os.remove(outfitsfile)
+	try:
+		with BinTableWriter(outfitsfile,columns,extname=filetype.upper(),
+				na_string=('--' if filetype == 'table' else '')) as writer:
+			for csvfile in csvfiles:
+				for df in read_chunks(csvfile):
+					writer.write(df)
+	except Exception as e:
+		if os.path.exists(outfitsfile):
+			os.remove(outfitsfile) # not to leave a broken fitsfile
+		raise
+	sys.stdout.write("%s is generated (%d rows).\n" % (outfitsfile,writer.nrows))
+
 def main(args=None):
 	parser = get_parser()
-	args = parser.parse_args(args) # get arguments 
+	args = parser.parse_args(args) # get arguments
+
+	for csvfile in args.csvfiles:
+		if not os.path.exists(csvfile):
+			raise FileNotFoundError("{} not found".format(csvfile))
 
-	if not os.path.exists(args.csvfile):
-		raise FileNotFoundError("{} not found".format(args.csvfile))
+	def_column_yaml = None
+	if args.column is not None:
+		sys.stdout.write('%s\n' % args.column)
+		def_column_yaml = yaml.load(open(args.column),Loader=yaml.FullLoader)
+
+	if args.merge is not None:
+		jobs = [(args.csvfiles,args.merge)]
+	else:
+		jobs = []
+		for csvfile in args.csvfiles:
+			outfitsfile = os.path.splitext(csvfile)[0] + '.fits'
+			if args.outdir is not None:
+				outfitsfile = '%s/%s' % (args.outdir,os.path.basename(outfitsfile))
+			jobs.append(([csvfile],outfitsfile))
+	if args.outdir is not None and not os.path.exists(args.outdir):
+		os.makedirs(args.outdir)
 
 	try:
-		outfitsfile = args.csvfile.replace('.csv','.fits')
-		cmd = 'rm -f %s' % outfitsfile
-		os.system(cmd)		
-
-		df = pd.read_csv(args.csvfile)
-		df = df.rename(columns={'Unnamed: 0': 'index'})	
-		table = Table.from_pandas(df)
-
-		if args.column is not None:
-			sys.stdout.write('%s\n' % args.column)
-			def_column_yaml = yaml.load(open(args.column),Loader=yaml.FullLoader)
-			for colname in table.columns:
-				if colname == 'index':
-					continue 
-				table[colname].unit = def_column_yaml[colname]['unit']
-				#table.columns[colname].format  = def_column_yaml[colname]['format']
-			table.write(outfitsfile)
+		for csvfiles, outfitsfile in jobs:
+			convert(csvfiles,outfitsfile,args.filetype,def_column_yaml,args.chunksize)
 	except Exception as e:
 		sys.stderr.write("[error]\n")
 		raise
-	else:
-		sys.stdout.write("%s is generated.\n" % outfitsfile)
 
 if __name__=="__main__":
 	main()
-
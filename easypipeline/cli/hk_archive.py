@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import argparse
+
+import os
+import sys
+
+from easypipeline.archive import HKArchive
+
+__author__ = 'Teruaki Enoto'
+__version__ = '0.01'
+
+def get_parser():
+	parser = argparse.ArgumentParser(
+		prog="hk_archive.py",
+		usage='%(prog)s archive_dir [--add csvfile ...] [--detid DetID --tstart time --tstop time --columns names]',
+		description="""
+Add HK csv files to the time-sorted HK archive, or query a time window
+of DetIDs from it, e.g., --detid 012 --tstart 2021-01-05 --tstop 2021-01-12
+--columns rate1,rate2,rate3 (the times are in JST).
+"""	)
+	parser.add_argument('archive_dir',metavar='archive_dir',type=str,
+		help='archive directory')
+	parser.add_argument('--add', '-a', type=str, nargs='+', default=None,
+		help='HK csv files to be added to the archive')
+	parser.add_argument('--cachedir', type=str, default=None,
+		help='columnar cache directory of the HK files (e.g., output/cache)')
+	parser.add_argument('--detid', '-d', type=str, default=None,
+		help='comma-separated DetIDs to be queried')
+	parser.add_argument('--tstart', type=str, default=None,
+		help='start of the window (JST, e.g., 2021-01-05 or 2021-01-05T12:00:00)')
+	parser.add_argument('--tstop', type=str, default=None,
+		help='stop of the window (JST, inclusive, a date is the whole day)')
+	parser.add_argument('--columns', type=str, default=None,
+		help='comma-separated column names (default: all the columns)')
+	parser.add_argument('--output', '-o', type=str, default=None,
+		help='output csv file of the query (default: stdout)')
+	return parser
+
+def main(args=None):
+	parser = get_parser()
+	args = parser.parse_args(args) # get arguments
+
+	archive = HKArchive(args.archive_dir)
+	if args.add is not None:
+		for csvfile in args.add:
+			if not os.path.exists(csvfile):
+				raise FileNotFoundError("{} not found".format(csvfile))
+			archive.add_file(csvfile,cachedir=args.cachedir)
+
+	if args.detid is not None:
+		detids = args.detid.split(',')
+		columns = None if args.columns is None else args.columns.split(',')
+		df = archive.query(detids[0] if len(detids) == 1 else detids,
+			tstart=args.tstart,tstop=args.tstop,columns=columns)
+		sys.stderr.write('{} rows selected.\n'.format(len(df)))
+		if args.output is None:
+			df.to_csv(sys.stdout,index=False)
+		else:
+			df.to_csv(args.output,index=False)
+			sys.stdout.write("%s is generated.\n" % args.output)
+	elif args.add is None:
+		for detid in archive.get_detids():
+			dates = archive.get_dates(detid)
+			sys.stdout.write('{}: {} days ({} - {})\n'.format(detid,len(dates),dates[0],dates[-1]))
+
+if __name__=="__main__":
+	main()
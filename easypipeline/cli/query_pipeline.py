@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import argparse
+
+import os
+import sys
+from astropy.table import Table
+
+import easypipeline.pipeline as pipeline
+from easypipeline.database import PipelineDatabase
+
+__author__ = 'Teruaki Enoto'
+__version__ = '0.01'
+
+def get_parser():
+	parser = argparse.ArgumentParser(
+		prog="query_pipeline.py",
+		usage='%(prog)s dbfile [--where condition] [--format csv|html|fits] [--output file]',
+		description="""
+Query the SQLite pipeline table (run_pipeline.py --flag_database),
+e.g., --where "Status = 'Error' AND Date LIKE '2021-01-%'",
+and export the rows in csv, html or fits.
+"""	)
+	parser.add_argument('dbfile',metavar='dbfile',type=str,
+		help='Input SQLite file (<outdir>/<name>.sqlite).')
+	parser.add_argument('--where', '-w', type=str, default=None,
+		help='SQL condition of the rows (default: all the rows)')
+	parser.add_argument('--columns', type=str, default=None,
+		help='comma-separated column names (default: all the columns)')
+	parser.add_argument('--order_by', type=str, default='"index"',
+		help='SQL ordering of the rows (default: "index")')
+	parser.add_argument('--format', '-f', type=str, default='csv', choices=['csv','html','fits'],
+		help='output format (default: csv)')
+	parser.add_argument('--output', '-o', type=str, default=None,
+		help='output file (default: stdout, required for fits)')
+	return parser
+
+def main(args=None):
+	parser = get_parser()
+	args = parser.parse_args(args) # get arguments
+
+	if not os.path.exists(args.dbfile):
+		raise FileNotFoundError("{} not found".format(args.dbfile))
+	if args.format == 'fits' and args.output is None:
+		parser.error('--output is required for fits.')
+
+	database = PipelineDatabase(args.dbfile)
+	columns = None if args.columns is None else args.columns.split(',')
+	df = database.query(where=args.where,columns=columns,order_by=args.order_by)
+	sys.stderr.write('{} rows selected.\n'.format(len(df)))
+
+	if args.format == 'csv':
+		content = df.to_csv(na_rep='--')
+	elif args.format == 'html':
+		df.index.name = None 
+		content = df.to_html(render_links=True, escape=False, na_rep='--')
+		for status, bgcolor in pipeline.STATUS_BGCOLORS.items():
+			content = content.replace('<td>%s</td>' % status,'<td bgcolor="%s">%s</td>' % (bgcolor,status))
+	elif args.format == 'fits':
+		for colname in df.columns:
+			if database.types[colname] == 'TEXT':
+				df[colname] = df[colname].fillna('--').astype(str)
+		table = Table.from_pandas(df.reset_index())
+		for colname in df.columns:
+			table[colname].unit = database.columns[colname]['unit'] or None
+		if os.path.exists(args.output):
+			os.remove(args.output)
+		table.write(args.output)
+		sys.stdout.write("%s is generated.\n" % args.output)
+		return
+
+	if args.output is None:
+		sys.stdout.write(content)
+	else:
+		with open(args.output,'w') as writer:
+			writer.write(content)
+		sys.stdout.write("%s is generated.\n" % args.output)
+
+if __name__=="__main__":
+	main()
@@ -26,15 +26,35 @@ Run pipeline process.
 	parser.add_argument('--outdir', '-o', type=str, required=True, 
 		help='output file directory path')
 	parser.add_argument('--flag_realtime_open', action='store_true')	
+	parser.add_argument('--workers', '-w', type=int, default=1, 
+		help='number of worker processes (default: 1, i.e., serial run)')
+	parser.add_argument('--flush_rows', type=int, default=1, 
+		help='write the summary table every N finished rows (default: 1, 0 to disable)')
+	parser.add_argument('--flush_sec', type=float, default=None, 
+		help='write the summary table every T seconds (default: disabled)')
+	parser.add_argument('--force', action='store_true', 
+		help='process all the rows, even if their inputs and parameters are unchanged')
+	parser.add_argument('--status_port', type=int, default=None, 
+		help='serve the live status of the table on http://127.0.0.1:PORT/ (default: disabled)')
+	parser.add_argument('--stages', type=str, default=None, 
+		help='comma-separated stages of each row in the parameter file, e.g., stats (numbers only) or plot (default: all)')
+	parser.add_argument('--flag_database', action='store_true', 
+		help='also keep the table in <outdir>/<name>.sqlite for query_pipeline.py')
 	return parser
 
 def main(args=None):
 	parser = get_parser()
 	args = parser.parse_args(args) # get arguments 
 
+	stages = args.stages.split(',') if args.stages is not None else None
+
 	pipe = pipeline.PipelineTable(args.name,args.column,args.param,
-		args.indir,args.outdir)
-	pipe.run_pipeline(args.flag_realtime_open)
+		args.indir,args.outdir,
+		flush_rows=(args.flush_rows if args.flush_rows > 0 else None),
+		flush_sec=args.flush_sec,flag_database=args.flag_database,
+		stages=stages)
+	pipe.run_pipeline(args.flag_realtime_open,workers=args.workers,force=args.force,
+		status_port=args.status_port)
 
 if __name__=="__main__":
 	main()
\ No newline at end of file
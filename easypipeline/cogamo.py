@@ -1,19 +1,415 @@
 # -*- coding: utf-8 -*-
 # Last modified 2023-07-06
 
+import io
+import itertools
 import os
 import re
 import sys
+import json 
+import time 
+import shutil 
 import numpy as np
 import pandas as pd 
+from collections import OrderedDict
 
-from astropy.time import Time
 from datetime import datetime, timedelta, timezone
 tz_tokyo = timezone(timedelta(hours=+9), 'Asia/Tokyo')
 tz_utc = timezone(timedelta(hours=0), 'UTC')
 
-import matplotlib.pylab as plt 
-import matplotlib.dates as dates
+from easypipeline.fileutils import get_file_hash
+
+# matplotlib is imported by import_matplotlib() when the first plot is made, 
+# so that the runs without plots (e.g., --stages stats) never load it.
+plt = None 
+dates = None 
+
+def import_matplotlib():
+	""" import pyplot and dates into this module. The quick look plots are only 
+	saved to files, so the non-interactive Agg backend is selected explicitly 
+	(no display is needed). """
+	global plt, dates
+	if plt is None:
+		import matplotlib 
+		matplotlib.use('Agg')
+		import matplotlib.pylab
+		import matplotlib.dates
+		plt = matplotlib.pylab
+		dates = matplotlib.dates
+
+# pandas read_csv engine. The C engine is faster than pyarrow for the HK 
+# files, since pyarrow spends most of its time converting the two text 
+# columns to python strings; 'pyarrow' can still be set here.
+CSV_ENGINE = 'c'
+
+# schema of the raw HK csv file (see the HKData docstring). Some firmware 
+# versions do not write the "n/a" column (17 columns instead of 18).
+HK_COLUMNS = OrderedDict([
+	('yyyymmdd',str),
+	('hhmmss',str),
+	('interval',np.int16),
+	('rate1',np.float32),
+	('rate2',np.float32),
+	('rate3',np.float32),
+	('rate4',np.float32),
+	('rate5',np.float32),
+	('rate6',np.float32),
+	('temperature',np.float32),
+	('pressure',np.float32),
+	('humidity',np.float32),
+	('differential',np.float32),
+	('lux',np.float32),
+	('n/a',np.float32),
+	('gps_status',np.int8),
+	('longitude',np.float64),
+	('latitude',np.float64)])
+HK_TIME_COLUMNS = ['yyyymmdd','hhmmss']
+HK_TIME_WIDTHS = {'yyyymmdd':10,'hhmmss':8}
+HK_UNITS = {'rate1':'count/s','rate2':'count/s','rate3':'count/s','rate4':'count/s',
+	'rate5':'count/s','rate6':'count/s','temperature':'deg_C','pressure':'hPa',
+	'humidity':'%','lux':'lx','longitude':'deg','latitude':'deg','unixtime':'s'}
+
+# version of the parsed frame written to the columnar cache. Increment this 
+# when the schema or the parsing changes, so that the old caches are rebuilt. 
+HK_CACHE_VERSION = 2 
+
+# energy bands of the count rates: L (1+2) <1 MeV, M (3+4) 1-3 MeV, H (5+6) >3 MeV
+HK_BANDS = OrderedDict([
+	('rate_l',['rate1','rate2']),
+	('rate_m',['rate3','rate4']),
+	('rate_h',['rate5','rate6'])])
+
+# channels of the summary statistics, and their names in the products 
+HK_STAT_CHANNELS = OrderedDict([
+	('rate1','Rate1'),('rate2','Rate2'),('rate3','Rate3'),
+	('rate4','Rate4'),('rate5','Rate5'),('rate6','Rate6'),
+	('rate_l','RateL'),('rate_m','RateM'),('rate_h','RateH'),
+	('temperature','Temperature'),('pressure','Pressure'),('humidity','Humidity'),
+	('differential','Differential'),('lux','Lux')])
+
+# the recording interval is in minutes; a step of the time longer than 
+# HK_GAP_FACTOR intervals is counted as a data gap
+HK_INTERVAL_UNIT_SEC = 60 
+HK_GAP_FACTOR = 1.5 
+
+def get_hk_products(df):
+	"""
+	Derived products of a parsed HK frame, computed in one vectorized pass:
+	the number of rows, the data gaps, the GPS-valid fraction and mean 
+	position (gps_status 1 or 2), and min/max/mean/std of each channel in 
+	HK_STAT_CHANNELS (NaN when the frame is empty). 
+	"""
+	products = OrderedDict()
+	products['Nevents'] = len(df)
+	if 'interval' in df.columns:
+		step = np.diff(df['unixtime'].to_numpy())
+		interval = df['interval'].to_numpy()[:-1].astype(np.float64) * HK_INTERVAL_UNIT_SEC
+		products['Ngaps'] = int(np.count_nonzero(step > HK_GAP_FACTOR * interval))
+	if 'gps_status' in df.columns:
+		valid = np.isin(df['gps_status'].to_numpy(),[1,2])
+		products['GPSValid'] = float(np.mean(valid)) if len(df) > 0 else np.nan 
+		for name, key in [('latitude','Latitude'),('longitude','Longitude')]:
+			if name in df.columns:
+				products[key] = float(np.mean(df[name].to_numpy()[valid])) if np.any(valid) else np.nan 
+	for name, label in HK_STAT_CHANNELS.items():
+		if name not in df.columns:
+			continue 
+		y = df[name].to_numpy(dtype=np.float64)
+		flag = np.isfinite(y)
+		y = y[flag]
+		if len(y) == 0:
+			for stat in ['min','max','mean','std']:
+				products['%s_%s' % (label,stat)] = np.nan 
+			continue 
+		# min and max are values of the data, written in their own precision 
+		dtype = df[name].dtype.type 
+		products['%s_min' % label] = float(str(dtype(np.min(y))))
+		products['%s_max' % label] = float(str(dtype(np.max(y))))
+		products['%s_mean' % label] = float(np.mean(y))
+		products['%s_std' % label] = float(np.std(y))
+	return products 
+
+def write_npy_columns(dirpath,df,meta):
+	""" write each column of the frame to dirpath/<column>.npy and the meta 
+	information to dirpath/meta.json. The directory is replaced atomically. """
+	tmpdir = '%s.tmp%d' % (dirpath,os.getpid())
+	if os.path.exists(tmpdir):
+		shutil.rmtree(tmpdir)
+	os.makedirs(tmpdir)
+	meta = OrderedDict(meta)
+	meta['columns'] = list(df.columns)
+	meta['nrows'] = len(df)
+	for i, name in enumerate(df.columns):
+		array = df[name].to_numpy()
+		if array.dtype == object:
+			array = array.astype(str)
+		np.save('%s/%03d.npy' % (tmpdir,i),array,allow_pickle=False)
+	with open('%s/meta.json' % tmpdir,'w') as writer:
+		json.dump(meta,writer,indent=1)
+	if os.path.exists(dirpath):
+		shutil.rmtree(dirpath)
+	os.replace(tmpdir,dirpath)
+
+def read_npy_meta(dirpath):
+	metafile = '%s/meta.json' % dirpath
+	if not os.path.exists(metafile):
+		return None 
+	with open(metafile) as reader:
+		return json.load(reader,object_pairs_hook=OrderedDict)
+
+def read_npy_columns(dirpath,columns=None,meta=None,mmap_mode='r'):
+	""" read the columns written by write_npy_columns, memory-mapped by default. """
+	if meta is None:
+		meta = read_npy_meta(dirpath)
+	data = OrderedDict()
+	for i, name in enumerate(meta['columns']):
+		if columns is not None and name not in columns:
+			continue 
+		array = np.load('%s/%03d.npy' % (dirpath,i),mmap_mode=mmap_mode,allow_pickle=False)
+		if array.dtype.kind == 'U':
+			array = array.astype(object)
+		data[name] = array 
+	return pd.DataFrame(data,copy=False)
+
+JST_OFFSET_SEC = 9 * 3600 
+
+def parse_jst_time(yyyymmdd,hhmmss):
+	"""
+	Fixed-format vectorized parser of the 'yyyy-mm-dd' and 'HH:MM:SS' (JST) 
+	columns. Returns the unixtime (float64) and the JST (datetime64[s]) arrays.
+	"""
+	days = np.asarray(yyyymmdd,dtype='datetime64[D]')
+	chars = np.asarray(hhmmss,dtype='S8').view(np.uint8).reshape(-1,8)
+	if np.any(chars[:,[2,5]] != ord(':')):
+		raise ValueError('time is not in the HH:MM:SS format.')
+	digits = chars[:,[0,1,3,4,6,7]].astype(np.int64) - ord('0')
+	if np.any(digits < 0) or np.any(digits > 9):
+		raise ValueError('time is not in the HH:MM:SS format.')
+	seconds = (digits[:,0]*10 + digits[:,1]) * 3600 + (digits[:,2]*10 + digits[:,3]) * 60 + digits[:,4]*10 + digits[:,5]
+	jst = days.astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+	unixtime = (jst.astype(np.int64) - JST_OFFSET_SEC).astype(np.float64)
+	return unixtime, jst 
+
+def to_unixtime(value,end_of_day=False):
+	""" unixtime of a JST time string ('2021-01-05' or '2021-01-05T12:00:00'),
+	a number is taken as a unixtime (None stays None). With end_of_day (tstop 
+	of a window, which is inclusive), a date without the time is the last 
+	second of that day, e.g., '2021-01-05' is 2021-01-05T23:59:59, since the 
+	HK times are in whole seconds. """
+	if value is None:
+		return None
+	if isinstance(value,str):
+		time = np.datetime64(value)
+		if end_of_day and np.datetime_data(time.dtype)[0] in ('Y','M','W','D'):
+			time = (time + 1).astype('datetime64[s]') - np.timedelta64(1,'s')
+		return float(time.astype('datetime64[s]').astype(np.int64) - JST_OFFSET_SEC)
+	return float(value)
+
+def to_hk_prefix(unixtime):
+	""" 'yyyy-mm-dd,HH:MM:SS' (JST) of a unixtime (rounded down to the second), 
+	i.e., the first 19 characters of a raw HK line """
+	return str(np.datetime64(int(np.floor(unixtime)) + JST_OFFSET_SEC,'s')).replace('T',',').encode('ascii')
+
+def select_hk_lines(data,tstart=None,tstop=None):
+	""" the raw HK lines (bytes) in tstart <= time <= tstop (unixtime, None for no 
+	limit) before they are parsed. The fixed-width time prefixes of the lines 
+	are compared as strings; the exact window is applied after parsing. """
+	start = b'' if tstart is None else to_hk_prefix(tstart)
+	if tstop is None:
+		lines = [line for line in data.split(b'\n') if line[:19] >= start]
+	else:
+		stop = to_hk_prefix(tstop)
+		lines = [line for line in data.split(b'\n') if start <= line[:19] <= stop]
+	return b'\n'.join(lines) + b'\n'
+
+def parse_hk_csv(data,nfields,columns=None):
+	"""
+	Typed DataFrame (HK_COLUMNS) of the raw HK csv lines in data (bytes) of a 
+	file with nfields fields per line (17 or 18, see HK_COLUMNS). The "n/a" 
+	column is added when missing. columns: columns to be read (None for all), 
+	the time columns are always read. 
+	"""
+	names = [name for name in HK_COLUMNS.keys() if nfields == len(HK_COLUMNS) or name != 'n/a']
+	if columns is None:
+		usecols = names
+	else:
+		usecols = [name for name in names if name in HK_TIME_COLUMNS or name in columns]
+	dtype = OrderedDict([(name,HK_COLUMNS[name]) for name in usecols])
+
+	# sometimes two lines are collapsed. These lines have too many 
+	# fields and are skipped. 
+	if CSV_ENGINE == 'c':
+		kwargs = dict(names=names, usecols=usecols, index_col=False)
+	else:
+		# pandas does not pass names together with usecols or 
+		# index_col=False to pyarrow, the columns are selected below.
+		kwargs = dict(names=names)
+	kwargs.update(encoding='utf-8', on_bad_lines='skip', engine=CSV_ENGINE)
+	try:
+		df = pd.read_csv(io.BytesIO(data), dtype=dtype, **kwargs)[usecols]
+	except (ValueError, TypeError) as e:
+		# a collapsed line with the right number of fields but 
+		# broken values: read as text and drop the lines which 
+		# are not numbers. 
+		df = pd.read_csv(io.BytesIO(data), dtype=str, **kwargs)[usecols]
+		for name in dtype.keys():
+			if name not in HK_TIME_COLUMNS:
+				df[name] = pd.to_numeric(df[name],errors='coerce')
+		df = df.dropna().reset_index(drop=True).astype(dtype)
+	if 'n/a' not in names and (columns is None or 'n/a' in columns):
+		# in the order of HK_COLUMNS: before gps_status (or the first of the 
+		# following columns which is read), else at the end 
+		following = list(HK_COLUMNS.keys())
+		following = [name for name in following[following.index('n/a')+1:] if name in df.columns]
+		loc = df.columns.get_loc(following[0]) if len(following) > 0 else len(df.columns)
+		df.insert(loc,'n/a',np.full(len(df),np.nan,dtype=HK_COLUMNS['n/a']))
+	return df 
+
+def read_hk_chunks(filepath,chunksize=100000):
+	"""
+	Read a raw HK csv file as typed DataFrames of chunksize lines (HK_COLUMNS 
+	and the unixtime column), for the files and the batches too large to be 
+	read at once. The broken lines are dropped as in HKData.open_file(). 
+	"""
+	with open(filepath,'rb') as reader:
+		nfields = reader.readline().count(b',') + 1
+		reader.seek(0)
+		while True:
+			data = b''.join(itertools.islice(reader,chunksize))
+			if len(data) == 0:
+				break 
+			df = parse_hk_csv(data,nfields)
+			df['unixtime'], jst = parse_jst_time(df['yyyymmdd'].to_numpy(),df['hhmmss'].to_numpy())
+			yield df 
+
+def unixtime_to_datetime64(unixtime):
+	""" UTC datetime64[ms] of unixtime (a number or an array) """
+	return np.round(np.asarray(unixtime,dtype=np.float64) * 1000).astype(np.int64).astype('datetime64[ms]')
+
+def decimate_minmax(y,max_points):
+	"""
+	Indices of the points to be drawn when y has more than max_points 
+	samples: the samples are divided into max_points/2 buckets (about one per 
+	pixel) and the minimum and the maximum of each bucket are kept, so that 
+	spikes survive the decimation. 
+	"""
+	npoints = len(y)
+	if max_points is None or npoints <= max_points:
+		return np.arange(npoints)
+	nbuckets = max(max_points // 2,1)
+	bucket = np.arange(npoints) * nbuckets // npoints 
+	order = np.lexsort((np.asarray(y),bucket))
+	bucket_sorted = bucket[order]
+	first = np.r_[True,bucket_sorted[1:] != bucket_sorted[:-1]]
+	last = np.r_[bucket_sorted[1:] != bucket_sorted[:-1],True]
+	return np.unique(np.concatenate([order[first],order[last],[0,npoints-1]]))
+
+class QLCurveFigure(object):
+	"""
+	8-panel quick look (QL) figure of the HK data. The figure and its axes 
+	are built once; draw() only updates the line data, the title and the 
+	time range, and saves the figure. 
+	"""
+	PANELS = [
+		(r"Rate L (cps)",'salmon'),
+		(r"Rate M (cps)",'tomato'),
+		(r"Rate H (cps)",'red'),
+		(r"Temp. (degC)",'k'),
+		(r"Press. (hPa)",'blue'),
+		(r"Humid. (%)",'yellowgreen'),
+		(r"Illum.",'purple'),
+		(r"GPS status",'sienna')]
+
+	def __init__(self):
+		import_matplotlib()
+		plt.rcParams['timezone'] = 'Asia/Tokyo'
+		# set the fonts before any artist is made, so that every figure 
+		# looks the same whichever process draws it first. 
+		plt.rcParams["font.family"] = "serif"
+		plt.rcParams["mathtext.fontset"] = "dejavuserif"		
+
+		# color https://matplotlib.org/stable/tutorials/colors/colors.html
+		self.fig, self.axs = plt.subplots(8,1, figsize=(8.27,11.69), 
+			sharex=True, gridspec_kw={'hspace': 0})
+		self.lines = []
+		for ax, (ylabel, color) in zip(self.axs,self.PANELS):
+			line, = ax.plot([],[],'-',c=color,drawstyle='steps-mid')
+			ax.set_ylabel(ylabel)
+			ax.xaxis_date()
+			self.lines.append(line)
+#		axs[6].step(time_series_jst,self.df['differential'],where='mid')		
+#		axs[6].set_ylabel(r"Diff (cps)")	
+#		axs[6].set_yscale('log')		
+		self.axs[6].set_yscale('log')
+		self.axs[7].set_xlabel(r"Time (JST)")
+		self.axs[7].set_ylim(-0.5,2.5)
+		self.axs[7].xaxis.set_major_formatter(dates.DateFormatter('%m-%d\n%H:%M'))
+
+		for ax in self.axs:
+			ax.label_outer()	
+			ax.minorticks_on()
+			ax.xaxis.grid(True)
+			ax.xaxis.grid(which='major', linestyle='--', color='#000000')
+			ax.xaxis.grid(which='minor', linestyle='-.')	
+			ax.xaxis.set_minor_locator(dates.HourLocator())
+			ax.tick_params(axis="both", which='major', direction='in', length=5)
+			ax.tick_params(axis="both", which='minor', direction='in', length=3)			
+		self.fig.align_ylabels(self.axs)
+		self.flag_layout_done = False 
+
+	def draw(self,outfile,time_series_jst,series_list,title,xlim,ylog=0,max_points=None,
+			dpi=None,thumbnail=None,thumbnail_dpi=12):
+		x = dates.date2num(time_series_jst)
+		self.npoints = 0
+		for line, y in zip(self.lines,series_list):
+			y = np.asarray(y)
+			index = decimate_minmax(y,max_points)
+			line.set_data(x[index],y[index])
+			self.npoints = max(self.npoints,len(index))
+		self.axs[0].set_title(title)
+		for ax in self.axs[0:3]:
+			ax.set_yscale('log' if ylog == 1 else 'linear')
+		for ax in self.axs:
+			ax.relim()
+			ax.autoscale_view(scalex=False)
+		self.axs[7].set_xlim(xlim[0],xlim[1])
+		if not self.flag_layout_done:
+			# the labels do not change between files, the layout of the 
+			# first draw is kept for the next ones.
+			self.fig.tight_layout(pad=2)
+			self.flag_layout_done = True 
+		self.fig.savefig(outfile,dpi=dpi)		
+		if thumbnail is not None:
+			self.fig.savefig(thumbnail,dpi=thumbnail_dpi)
+
+	def close(self):
+		plt.close(self.fig)
+
+# figure kept by each process when the QL figure is reused 
+qlcurve_figure = None 
+
+def get_qlcurve_figure():
+	global qlcurve_figure
+	if qlcurve_figure is None:
+		qlcurve_figure = QLCurveFigure()
+	return qlcurve_figure 
+
+def get_thumbnail_path(outdir_root,basename):
+	# kept outside of the output directory, which set_outdir removes
+	return '%s/thumbnail/%s.png' % (outdir_root,basename)
+
+def get_plot_values(outdir_root,basename,param):
+	""" links to the quick look plot (and thumbnail, shown inline in the html 
+	table) in the pipeline table, and the paths of these files """
+	qlplot_fname = '%s.%s' % (basename,param.get('ql_format','pdf'))
+	qlplot_path = '%s/data/%s/%s' % (outdir_root,basename,qlplot_fname)
+	values = OrderedDict([('QLcurve','<a href=\"../%s\">%s</a>' % (qlplot_path,qlplot_fname))])
+	outputs = [qlplot_path]
+	if param.get('ql_thumbnail',False):
+		thumbnail_path = get_thumbnail_path(outdir_root,basename)
+		values['Thumbnail'] = '<a href=\"../%s\"><img src=\"../%s\" loading=\"lazy\"></a>' % (qlplot_path,thumbnail_path)
+		outputs.append(thumbnail_path)
+	return values, outputs 
 
 class HKData():
 	"""
@@ -36,18 +432,63 @@ class HKData():
 	17. longitude (deg)
 	18. latitude (deg)
 	"""
-	def __init__(self, filepath):	
+	def __init__(self, filepath, time_parser='numpy', columns=None, cachedir=None, param=None,
+			tstart=None, tstop=None, flag_time_series=True):	
 		self.filetype = None		
 		self.filepath = filepath
+		self.time_parser = time_parser # 'numpy' (fast, fixed format) or 'astropy'
+		self.columns = columns # columns to be loaded (None for all), the time columns are always loaded.
+		self.cachedir = cachedir # directory of the columnar cache of the parsed frame (None for no cache)
+		# time window (JST strings or unixtime, None for no limit) of the rows to 
+		# be loaded, tstart <= unixtime <= tstop (a date-only tstop is the whole day)
+		self.tstart = to_unixtime(tstart)
+		self.tstop = to_unixtime(tstop,end_of_day=True)
 		self.filename = os.path.basename(self.filepath)
 		self.basename = os.path.splitext(self.filename)[0]
 
-		self.param = {}
+		self.param = param if param is not None else {} # analysis parameters (input_parameter.yaml)
+		self.products = None # derived products (get_products), kept in the cache
 		self.pdflist = []
+		self.outputs = [] # files made by this object, recorded in the run manifest
 
 		self.set_filetype()
-		self.open_file()
-		self.set_time_series()
+		self.load()
+		if flag_time_series:
+			self.make_time_series()
+
+	def load(self):
+		""" read the frame from the columnar cache, or parse the csv file (all 
+		the columns and rows when the cache is to be written) """
+		self.flag_cached = False 
+		if self.cachedir is not None and self.time_parser == 'numpy':
+			if self.read_cache():
+				self.flag_cached = True # with its time series 
+				return 
+			# the cache keeps all the columns and rows
+			columns, self.columns = self.columns, None
+			window, (self.tstart, self.tstop) = (self.tstart, self.tstop), (None, None)
+			try:
+				self.open_file()
+			finally:
+				self.columns = columns 
+				self.tstart, self.tstop = window 
+		else:
+			self.open_file()
+
+	def make_time_series(self):
+		""" time and band-rate columns of the parsed frame (written to the cache), 
+		then the column subset and the time window """
+		if not self.flag_cached:
+			self.set_time_series()
+			self.set_band_rates()
+			if self.cachedir is not None and self.time_parser == 'numpy':
+				self.write_cache()
+				if self.columns is not None:
+					self.df = self.df[[name for name in self.df.columns if name in self.columns or name in HK_TIME_COLUMNS + ['unixtime','jst']]]
+		if self.tstart is not None or self.tstop is not None:
+			self.df = self.select_time(self.tstart,self.tstop)
+			self.nevents = len(self.df)
+			self.products = None # of the whole file, made again for the window 
 
 	def set_filetype(self):
 		if re.fullmatch(r'\d{3}_\d{8}.csv', self.filename):
@@ -68,15 +509,18 @@ class HKData():
 			#print(cmd);os.system(cmd)
 
 			if self.filetype == 'rawcsv':
-#				self.df = pd.read_csv(self.filepath, index_col=False, on_bad_lines='skip', encoding='utf-8',
-				self.df = pd.read_csv(self.filepath, index_col=False, encoding='utf-8',
-					names=['yyyymmdd','hhmmss','interval','rate1','rate2','rate3','rate4','rate5','rate6','temperature','pressure','humidity','differential','lux','n/a','gps_status','longitude','latitude'],
-					dtype={})
+				with open(self.filepath,'rb') as reader:
+					data = reader.read()
+				nfields = data[:data.find(b'\n')].count(b',') + 1
+				if self.tstart is not None or self.tstop is not None:
+					data = select_hk_lines(data,self.tstart,self.tstop)
+				self.df = parse_hk_csv(data,nfields,self.columns)
 				self.nevents = len(self.df)
 
-				# sometimes two lines are collapsed. This process excludes these lines. 
-				#flag = pd.to_numeric(self.df['latitude'],errors='coerce').isnull()
-				#self.df = self.df[~flag]
+				nlines = data.count(b'\n') - data.count(b'\n\n') + (0 if data.endswith(b'\n') else 1)
+				self.nskipped = nlines - self.nevents
+				if self.nskipped > 0:
+					sys.stdout.write('-- HKData {}: {} broken lines are skipped.\n'.format(self.basename,self.nskipped))
 
 			else:
 				sys.stdout.write("[error] filetype error...")
@@ -90,12 +534,79 @@ class HKData():
 	def set_time_series(self):		
 		sys.stdout.write('-- HKData {}: {}\n'.format(self.basename,sys._getframe().f_code.co_name))
 
-		tmp_time_series_str = np.char.array(self.df['yyyymmdd'] + 'T' + self.df['hhmmss'])
-		tmp_time_series_jst = Time(tmp_time_series_str, format='isot', scale='utc', precision=5) 	
-		tmp_time_series_utc = tmp_time_series_jst - timedelta(hours=+9)		
-		self.df['unixtime'] = tmp_time_series_utc.to_value('unix',subfmt='decimal')
-		self.df['unixtime'] = self.df['unixtime'].astype(np.float64)
-		self.df['jst'] = tmp_time_series_jst
+		if self.time_parser == 'astropy':
+			from astropy.time import Time
+			tmp_time_series_str = np.char.array(self.df['yyyymmdd'] + 'T' + self.df['hhmmss'])
+			tmp_time_series_jst = Time(tmp_time_series_str, format='isot', scale='utc', precision=5) 	
+			tmp_time_series_utc = tmp_time_series_jst - timedelta(hours=+9)		
+			self.df['unixtime'] = tmp_time_series_utc.to_value('unix',subfmt='decimal')
+			self.df['unixtime'] = self.df['unixtime'].astype(np.float64)
+			self.df['jst'] = tmp_time_series_jst
+		else:
+			self.df['unixtime'], self.df['jst'] = parse_jst_time(self.df['yyyymmdd'],self.df['hhmmss'])
+
+	def select_time(self,tstart=None,tstop=None):
+		""" rows of the frame in tstart <= unixtime <= tstop (JST strings or 
+		unixtime, None for no limit). self.df is not changed; a slice of it is 
+		returned when the rows are time-sorted. """
+		tstart = to_unixtime(tstart)
+		tstop = to_unixtime(tstop,end_of_day=True)
+		if tstart is None and tstop is None:
+			return self.df 
+		unixtime = self.df['unixtime'].to_numpy()
+		if np.all(unixtime[1:] >= unixtime[:-1]):
+			istart = 0 if tstart is None else np.searchsorted(unixtime,tstart,side='left')
+			istop = len(unixtime) if tstop is None else np.searchsorted(unixtime,tstop,side='right')
+			return self.df.iloc[istart:istop]
+		flag = np.ones(len(unixtime),dtype=bool)
+		if tstart is not None:
+			flag &= unixtime >= tstart 
+		if tstop is not None:
+			flag &= unixtime <= tstop 
+		return self.df[flag]
+
+	def set_band_rates(self):
+		""" energy-band sums of the count rates (HK_BANDS), kept in the cache """
+		for band, names in HK_BANDS.items():
+			if all([name in self.df.columns for name in names]):
+				self.df[band] = self.df[names[0]] + self.df[names[1]]
+
+	def get_products(self):
+		""" derived products of the frame (get_hk_products), computed once """
+		if self.products is None:
+			self.products = get_hk_products(self.df)
+		return self.products 
+
+	def get_cache_path(self):
+		return '%s/%s' % (self.cachedir,self.basename)
+
+	def read_cache(self):
+		""" load the parsed frame from the columnar cache. Returns False when the 
+		cache is missing or stale (different source hash or schema version). """
+		if not os.path.exists(self.filepath):
+			raise FileNotFoundError("{} not found".format(self.filepath))
+		self.sha256 = get_file_hash(self.filepath)
+		meta = read_npy_meta(self.get_cache_path())
+		if meta is None or meta.get('version') != HK_CACHE_VERSION or meta.get('sha256') != self.sha256:
+			return False 
+		columns = None
+		if self.columns is not None:
+			columns = list(self.columns) + HK_TIME_COLUMNS + ['unixtime','jst']
+		self.df = read_npy_columns(self.get_cache_path(),columns=columns,meta=meta)
+		self.nevents = len(self.df)
+		self.nskipped = meta['nskipped']
+		self.products = OrderedDict(meta['products']) # of all the columns and rows
+		sys.stdout.write('-- HKData {}: {} {}\n'.format(self.basename,sys._getframe().f_code.co_name,self.get_cache_path()))
+		return True 
+
+	def write_cache(self):
+		sys.stdout.write('-- HKData {}: {}\n'.format(self.basename,sys._getframe().f_code.co_name))
+		if not os.path.exists(self.cachedir):
+			os.makedirs(self.cachedir,exist_ok=True)
+		write_npy_columns(self.get_cache_path(),self.df,
+			OrderedDict([('version',HK_CACHE_VERSION),('sha256',self.sha256),
+				('filepath',self.filepath),('nskipped',self.nskipped),
+				('products',self.get_products())]))
 
 	def set_outdir(self,outdir_root,flag_overwrite=True,flag_verbose=False):
 		sys.stdout.write('-- HKData {}: {}\n'.format(self.basename,sys._getframe().f_code.co_name))
@@ -103,29 +614,33 @@ class HKData():
 		self.outdir_root = outdir_root
 		self.outdir = '%s/data/%s' % (self.outdir_root, self.basename)
 
-		if flag_overwrite:
-			cmd = 'rm -rf %s' % self.outdir
-			if flag_verbose: print(cmd)
-			os.system(cmd)
+		if flag_overwrite and os.path.exists(self.outdir):
+			if flag_verbose: print('rm -rf %s' % self.outdir)
+			shutil.rmtree(self.outdir)
 
 		if not os.path.exists(self.outdir):
-			cmd = 'mkdir -p %s' % self.outdir
-			if flag_verbose: print(cmd)
-			os.system(cmd)
+			if flag_verbose: print('mkdir -p %s' % self.outdir)
+			os.makedirs(self.outdir,exist_ok=True)
 
-	def plot_qlcurves(self,outpdf,tstart=None,tstop=None,ylog=0):
+	def plot_qlcurves(self,outpdf,tstart=None,tstop=None,ylog=0,flag_reuse_figure=None,max_points=None,
+			dpi=None,thumbnail=None):
 		sys.stdout.write('-- HKData {}: {}\n'.format(self.basename,sys._getframe().f_code.co_name))
 
-		time_series_utc = Time(self.df['unixtime'],format='unix',scale='utc')
-		time_series_jst = time_series_utc.to_datetime(timezone=tz_tokyo)
-		plt.rcParams['timezone'] = 'Asia/Tokyo'
+		# the window is applied to a view, self.df keeps all the rows for the next calls
+		df = self.select_time(tstart,tstop)
+		if len(df) == 0:
+			raise ValueError('no data in the time window.')
+		# UTC datetime64, shown in JST by the timezone of the figure 
+		time_series_jst = unixtime_to_datetime64(df['unixtime'].to_numpy())
+
+		products = self.get_products() if df is self.df else get_hk_products(df)
 
 		title  = 'DET_ID=%s ' % self.detid_str
-		title += '(Longitude=%.3f deg, ' % (np.mean(pd.to_numeric(self.df['latitude'],errors='coerce')))
-		title += 'Latitude=%.3f deg)' % (np.mean(pd.to_numeric(self.df['longitude'],errors='coerce')))		
+		title += '(Longitude=%.3f deg, ' % (products['Longitude'])
+		title += 'Latitude=%.3f deg)' % (products['Latitude'])		
 		title += '\n'
-		title += '%s ' % str(time_series_jst[0])[0:10]
-		title += 'Interval=%d sec ' % (self.df['interval'][0])
+		title += '%s ' % df['yyyymmdd'].iloc[0]
+		title += 'Interval=%d min ' % (df['interval'].iloc[0])
 		title += '(%s)' % self.filename
 		title += '\n'		
 		#if self.hdu['HK'].header['AREABD2'] > 0.0:
@@ -136,105 +651,79 @@ class HKData():
 		title += 'Rate M (3+4):1-3 MeV, '
 		title += 'Rate H (5+6):>3 MeV '
 
-		if tstart is not None and tstop is not None:
-			tmp_tstart_jst = Time(tstart, format='isot', scale='utc', precision=5) 	
-			tmp_tstart_utc = tmp_tstart_jst - timedelta(hours=+9)		
-			tstart_jst = tmp_tstart_utc.to_datetime(timezone=tz_tokyo)
-
-			tmp_tstop_jst = Time(tstop, format='isot', scale='utc', precision=5) 	
-			tmp_tstop_utc = tmp_tstop_jst - timedelta(hours=+9)		
-			tstop_jst = tmp_tstop_utc.to_datetime(timezone=tz_tokyo)		
-
-			flag = np.logical_and(time_series_jst >= tstart_jst,time_series_jst <= tstop_jst)
-			time_series_jst = time_series_jst[flag]				
-			self.df = self.df[flag]
-
-		# color https://matplotlib.org/stable/tutorials/colors/colors.html
-		fig, axs = plt.subplots(8,1, figsize=(8.27,11.69), 
-			sharex=True, gridspec_kw={'hspace': 0})
-		axs[0].step(
-			time_series_jst,
-			self.df['rate1']+self.df['rate2'],
-			'-', c='salmon',mec='k', markersize=2,where='mid')
-		axs[0].set_ylabel(r"Rate L (cps)")
-		axs[0].set_title(title)	
-		if ylog == 1: axs[0].set_yscale('log')
-		axs[1].step(
-			time_series_jst,
-			self.df['rate3']+self.df['rate4'],
-			'-', c='tomato',mec='k', markersize=2,where='mid')
-		axs[1].set_ylabel(r"Rate M (cps)")	
-		if ylog == 1: axs[1].set_yscale('log')		
-		axs[2].step(
-			time_series_jst,
-			self.df['rate5']+self.df['rate6'],
-			'-',c='red',mec='k', markersize=2,where='mid')
-		axs[2].set_ylabel(r"Rate H (cps)")				
-		if ylog == 1: axs[2].set_yscale('log')				
-		axs[3].step(time_series_jst,self.df['temperature'],
-			'-',c='k',where='mid')
-		axs[3].set_ylabel(r"Temp. (degC)")
-		axs[4].step(time_series_jst,self.df['pressure'],
-			'-',c='blue',where='mid')
-		axs[4].set_ylabel(r"Press. (hPa)")		
-		axs[5].step(time_series_jst,self.df['humidity'],
-			'-',c='yellowgreen',where='mid')
-		axs[5].set_ylabel(r"Humid. (%)")
-#		axs[6].step(time_series_jst,self.df['differential'],where='mid')		
-#		axs[6].set_ylabel(r"Diff (cps)")	
-#		axs[6].set_yscale('log')		
-		axs[6].step(time_series_jst,self.df['lux'],
-			'-',c='purple',where='mid')		
-		axs[6].set_yscale('log')
-		axs[6].set_ylabel(r"Illum.")
-		axs[7].step(time_series_jst,self.df['gps_status'],
-			'-',c='sienna',where='mid')		
-		axs[7].set_ylabel(r"GPS status")		
-		axs[7].set_xlabel(r"Time (JST)")
-		axs[7].set_ylim(-0.5,2.5)
-		axs[7].xaxis.set_major_formatter(dates.DateFormatter('%m-%d\n%H:%M'))
-
-		if tstart is not None and tstop is not None:
-			tmp_tstart_jst = Time(tstart, format='isot', scale='utc', precision=5) 	
-			tmp_tstart_utc = tmp_tstart_jst - timedelta(hours=+9)		
-			tstart_jst = tmp_tstart_utc.to_datetime(timezone=tz_tokyo)
-			tmp_tstop_jst = Time(tstop, format='isot', scale='utc', precision=5) 	
-			tmp_tstop_utc = tmp_tstop_jst - timedelta(hours=+9)		
-			tstop_jst = tmp_tstop_utc.to_datetime(timezone=tz_tokyo)
-			axs[7].set_xlim(tstart_jst,tstop_jst)
+		xlim = (time_series_jst[0] if tstart is None else unixtime_to_datetime64(to_unixtime(tstart)),
+			time_series_jst[-1] if tstop is None else unixtime_to_datetime64(to_unixtime(tstop,end_of_day=True)))
+
+		series_list = [
+			df['rate_l'],
+			df['rate_m'],
+			df['rate_h'],
+			df['temperature'],
+			df['pressure'],
+			df['humidity'],
+			df['lux'],
+			df['gps_status']]
+
+		if flag_reuse_figure is None:
+			flag_reuse_figure = self.param.get('ql_reuse_figure',False)
+		if max_points is None:
+			max_points = self.param.get('ql_max_points',None)
+		if dpi is None:
+			dpi = self.param.get('ql_dpi',None)
+		kwargs = dict(ylog=ylog,max_points=max_points,dpi=dpi,thumbnail=thumbnail,
+			thumbnail_dpi=self.param.get('ql_thumbnail_dpi',12))
+		render_start = time.time()
+		if flag_reuse_figure:
+			qlfig = get_qlcurve_figure()
+			qlfig.draw(outpdf,time_series_jst,series_list,title,xlim,**kwargs)
 		else:
-			axs[7].set_xlim(time_series_jst[0],time_series_jst[-1])
-
-		for ax in axs:
-			ax.label_outer()	
-			ax.minorticks_on()
-			ax.xaxis.grid(True)
-			ax.xaxis.grid(which='major', linestyle='--', color='#000000')
-			ax.xaxis.grid(which='minor', linestyle='-.')	
-			ax.xaxis.set_minor_locator(dates.HourLocator())
-			ax.tick_params(axis="both", which='major', direction='in', length=5)
-			ax.tick_params(axis="both", which='minor', direction='in', length=3)			
-
-		fig.align_ylabels(axs)
-		plt.tight_layout(pad=2)
-		plt.rcParams["font.family"] = "serif"
-		plt.rcParams["mathtext.fontset"] = "dejavuserif"		
-		plt.savefig(outpdf)		
-
-	def run(self,piptable,index):
-		sys.stdout.write('-- HKData {}: {}\n'.format(self.basename,sys._getframe().f_code.co_name))
-		self.set_outdir(piptable.outdir)
-
+			qlfig = QLCurveFigure()
+			try:
+				qlfig.draw(outpdf,time_series_jst,series_list,title,xlim,**kwargs)
+			finally:
+				qlfig.close()
+		sys.stdout.write('-- HKData {}: {} points/panel (of {}), {:.2f} sec, {} bytes\n'.format(
+			self.basename,qlfig.npoints,len(time_series_jst),time.time()-render_start,os.path.getsize(outpdf)))
+
+	def set_basic_values(self,values):
 		### add basic information to the table 
-		piptable.df.iloc[index]['DetID'] = self.detid_str
-		piptable.df.iloc[index]['Interval'] = self.df['interval'][0]
-		piptable.df.iloc[index]['Date'] = str(self.df['jst'][0])[0:10]
-
-		### add quick look (QL) curve plot
-		qlplot_fname = '%s.pdf' % self.basename
-		qlplot_path = '%s/%s.pdf' % (self.outdir,self.basename)		
-		self.plot_qlcurves(outpdf=qlplot_path)
-		piptable.df.iloc[index]['QLcurve'] = '<a href=\"../%s\">%s</a>' % (qlplot_path,qlplot_fname)
-
-
-
+		values['DetID'] = self.detid_str
+		values['Interval'] = self.df['interval'].iloc[0]
+		values['Date'] = self.df['yyyymmdd'].iloc[0]
+		return values 
+
+	def set_stats_values(self,values):
+		self.set_basic_values(values)
+		### add the derived products (counts, gaps, GPS position, statistics of 
+		### each channel); the columns listed in def_columns.yaml are shown
+		values.update(self.get_products())
+		return values 
+
+	def plot(self,outdir_root,values,flag_thumbnail_check=True):
+		""" make the quick look plot and its thumbnail (only when it is stale with 
+		flag_thumbnail_check), and add their links to values """
+		self.set_outdir(outdir_root)
+
+		### add quick look (QL) curve plot (pdf, png or svg)
+		qlplot_fname = '%s.%s' % (self.basename,self.param.get('ql_format','pdf'))
+		qlplot_path = '%s/%s' % (self.outdir,qlplot_fname)		
+		thumbnail_path = None 
+		if self.param.get('ql_thumbnail',False):
+			thumbnail_path = self.get_thumbnail_path(outdir_root)
+			os.makedirs(os.path.dirname(thumbnail_path),exist_ok=True)
+			if flag_thumbnail_check and not self.is_thumbnail_stale(thumbnail_path):
+				thumbnail_path = None 
+		self.plot_qlcurves(outpdf=qlplot_path,thumbnail=thumbnail_path)
+		plot_values, outputs = get_plot_values(outdir_root,self.basename,self.param)
+		values.update(plot_values)
+		self.outputs.extend(outputs)
+		return values 
+
+	def get_thumbnail_path(self,outdir_root):
+		return get_thumbnail_path(outdir_root,self.basename)
+
+	def is_thumbnail_stale(self,thumbnail_path):
+		""" a thumbnail is made only when it is missing or older than the input file. """
+		if not os.path.exists(thumbnail_path):
+			return True 
+		return os.path.getmtime(thumbnail_path) < os.path.getmtime(self.filepath)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import pandas as pd
+from collections import OrderedDict
+
+from easypipeline.fitswriter import check_tform
+
+TABLE_NAME = 'pipeline'
+INDEX_COLUMNS = ['Status','DetID','Date']
+
+# SQLite column types of the FITS TFORM codes (fitswriter.check_tform)
+TFORM_SQLITE_TYPES = {'L':'INTEGER','B':'INTEGER','I':'INTEGER','J':'INTEGER','K':'INTEGER',
+	'E':'REAL','D':'REAL','A':'TEXT'}
+
+def get_sqlite_type(tform):
+	""" SQLite column type of a FITS TFORM in def_columns.yaml (e.g., K, 16A, E) """
+	repeat, code = check_tform(tform)
+	return TFORM_SQLITE_TYPES[code]
+
+def quote(name):
+	return '"%s"' % name.replace('"','""')
+
+class PipelineDatabase(object):
+	"""
+	SQLite copy of a PipelineTable with the column types declared in
+	def_columns.yaml, so that the table can be queried (e.g., errors of
+	a DetID in a month) without loading the csv file. The '--' cells are
+	stored as NULL.
+	"""
+	def __init__(self,dbpath,def_column_yaml=None):
+		self.dbpath = dbpath
+		self.connection = sqlite3.connect(self.dbpath)
+		self.connection.execute('PRAGMA journal_mode=WAL') # readers during the run
+		if def_column_yaml is not None:
+			self.create_table(def_column_yaml)
+		self.columns = self.read_columns()
+		self.types = OrderedDict([(name,get_sqlite_type(column['format'])) for name, column in self.columns.items()])
+
+	def create_table(self,def_column_yaml):
+		""" (re)create the table, it is a view of the pipeline and filled again in each run """
+		with self.connection:
+			self.connection.execute('DROP TABLE IF EXISTS %s' % TABLE_NAME)
+			self.connection.execute('DROP TABLE IF EXISTS columns')
+			self.connection.execute('CREATE TABLE columns (name TEXT PRIMARY KEY, format TEXT, unit TEXT)')
+			self.connection.executemany('INSERT INTO columns VALUES (?,?,?)',
+				[(name,str(column['format']),str(column['unit'])) for name, column in def_column_yaml.items()])
+			definitions = ['"index" INTEGER PRIMARY KEY']
+			for name, column in def_column_yaml.items():
+				definitions.append('%s %s' % (quote(name),get_sqlite_type(column['format'])))
+			self.connection.execute('CREATE TABLE %s (%s)' % (TABLE_NAME,', '.join(definitions)))
+			for name in INDEX_COLUMNS:
+				if name in def_column_yaml:
+					self.connection.execute('CREATE INDEX %s ON %s (%s)' % (
+						quote('idx_%s' % name),TABLE_NAME,quote(name)))
+
+	def read_columns(self):
+		columns = OrderedDict()
+		for name, tform, unit in self.connection.execute('SELECT name, format, unit FROM columns ORDER BY rowid'):
+			columns[name] = OrderedDict([('format',tform),('unit',unit)])
+		return columns
+
+	def to_sql_value(self,name,value):
+		if value is None or value is pd.NA or (isinstance(value,str) and value == '--'):
+			return None
+		if hasattr(value,'item'):
+			value = value.item() # numpy scalars
+		try:
+			if self.types[name] == 'INTEGER':
+				return int(value)
+			elif self.types[name] == 'REAL':
+				return float(value)
+		except (TypeError, ValueError) as e:
+			pass # stored as it is, SQLite keeps the value in its own type
+		return value if isinstance(value,(int,float)) else str(value)
+
+	def insert_rows(self,df):
+		names = [name for name in df.columns if name in self.types]
+		sql = 'INSERT OR REPLACE INTO %s ("index", %s) VALUES (?, %s)' % (
+			TABLE_NAME,', '.join([quote(name) for name in names]),', '.join(['?']*len(names)))
+		self.connection.executemany(sql,
+			[[int(index)] + [self.to_sql_value(name,row[name]) for name in names] for index, row in df.iterrows()])
+
+	def update_row(self,index,values):
+		""" values: {column: value}, committed in the next commit() """
+		names = [name for name in values.keys() if name in self.types]
+		if len(names) == 0:
+			return
+		sql = 'UPDATE %s SET %s WHERE "index" = ?' % (TABLE_NAME,
+			', '.join(['%s = ?' % quote(name) for name in names]))
+		self.connection.execute(sql,
+			[self.to_sql_value(name,values[name]) for name in names] + [int(index)])
+
+	def commit(self):
+		self.connection.commit()
+
+	def close(self):
+		self.connection.commit()
+		self.connection.close()
+
+	def query(self,where=None,columns=None,order_by='"index"',params=()):
+		""" pandas DataFrame of the rows matching the SQL condition `where` """
+		sql = 'SELECT %s FROM %s' % ('*' if columns is None else 
+			', '.join(['"index"'] + [quote(name) for name in columns]),TABLE_NAME)
+		if where is not None:
+			sql += ' WHERE %s' % where
+		if order_by is not None:
+			sql += ' ORDER BY %s' % order_by
+		df = pd.read_sql_query(sql,self.connection,index_col='index',params=params)
+		for name in df.columns:
+			if self.types.get(name) == 'INTEGER':
+				df[name] = df[name].astype('Int64') # not float64 with NULL cells
+		return df
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib 
+from collections import OrderedDict
+
+def get_file_hash(filepath,blocksize=2**20):
+	""" sha256 of the file, read in blocks not to load it in memory """
+	sha256 = hashlib.sha256()
+	with open(filepath,'rb') as reader:
+		for block in iter(lambda: reader.read(blocksize), b''):
+			sha256.update(block)
+	return sha256.hexdigest()
+
+def get_file_fingerprint(filepath,previous=None):
+	""" size, mtime and content hash of the file. The hash of the previous 
+	fingerprint is reused when the size and mtime did not change. """
+	stat = os.stat(filepath)
+	fingerprint = OrderedDict([('size',stat.st_size),('mtime',stat.st_mtime)])
+	if previous is not None and previous.get('size') == stat.st_size and previous.get('mtime') == stat.st_mtime:
+		fingerprint['sha256'] = previous['sha256']
+	else:
+		fingerprint['sha256'] = get_file_hash(filepath)
+	return fingerprint 
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import re
+import numpy as np
+from collections import OrderedDict
+
+# astropy is imported by BinTableWriter, so that the TFORM functions are 
+# used by the pipeline table and the database without loading it
+
+FITS_BLOCK = 2880
+
+# big-endian record types of the FITS TFORM codes
+TFORM_DTYPES = OrderedDict([
+	('L','S1'),
+	('B','u1'),
+	('I','>i2'),
+	('J','>i4'),
+	('K','>i8'),
+	('E','>f4'),
+	('D','>f8')])
+
+# TNULL of the integer columns, the missing cells of the pipeline table
+TFORM_TNULLS = {'I':-32768,'J':-2147483648,'K':-9223372036854775808}
+
+def split_tform(tform):
+	""" '16A' -> (16, 'A'), 'K' -> (1, 'K') """
+	match = re.match(r'^\s*([0-9]*)\s*([A-Z])\s*$',str(tform).upper())
+	if match is None:
+		raise ValueError('unsupported TFORM: {}'.format(tform))
+	return int(match.group(1) or 1), match.group(2)
+
+def check_tform(tform):
+	""" (repeat, code) of a TFORM supported by BinTableWriter and the pipeline 
+	table: nA strings, or a single L, B, I, J, K, E or D, else ValueError """
+	repeat, code = split_tform(tform)
+	if code != 'A' and (code not in TFORM_DTYPES or repeat != 1):
+		raise ValueError('unsupported TFORM: {}'.format(tform))
+	return repeat, code 
+
+def get_tform(dtype,width=None):
+	""" TFORM of a numpy or pandas dtype, width for the strings """
+	if hasattr(dtype,'numpy_dtype'):
+		dtype = dtype.numpy_dtype # Int64, Float64, boolean 
+	elif not isinstance(dtype,np.dtype):
+		dtype = np.dtype(object) # string, category 
+	if dtype.kind in ('U','S','O'):
+		return '%dA' % max(width or 1,1)
+	elif dtype.kind == 'b':
+		return 'L'
+	elif dtype.kind == 'u' and dtype.itemsize == 1:
+		return 'B'
+	elif dtype.kind in ('i','u'):
+		return {1:'I',2:'I',4:'J'}.get(dtype.itemsize,'K')
+	elif dtype.kind == 'f':
+		return 'E' if dtype.itemsize <= 4 else 'D'
+	raise ValueError('unsupported dtype: {}'.format(dtype))
+
+class BinTableWriter(object):
+	"""
+	Streaming writer of a FITS binary table. The header (TTYPE, TFORM,
+	TUNIT) is written first, the rows are appended chunk by chunk as raw
+	big-endian records, and NAXIS2 is filled in on close(), so that the
+	memory does not depend on the number of rows.
+	"""
+	def __init__(self,outfits,columns,extname='TABLE',na_string=''):
+		""" columns: OrderedDict of {name: (tform, unit)}, na_string: 
+		written in the missing string cells """
+		self.outfits = outfits
+		self.columns = columns
+		self.na_string = na_string
+		self.nrows = 0
+
+		from astropy.io import fits
+		self.fits = fits 
+
+		fields = []
+		self.tnulls = {}
+		for name, (tform, unit) in self.columns.items():
+			try:
+				repeat, code = check_tform(tform)
+			except ValueError as e:
+				raise ValueError('unsupported TFORM of {}: {}'.format(name,tform))
+			if code == 'A':
+				fields.append((name,'S%d' % repeat))
+			else:
+				fields.append((name,TFORM_DTYPES[code]))
+			if code in TFORM_TNULLS:
+				self.tnulls[name] = TFORM_TNULLS[code]
+		self.dtype = np.dtype(fields)
+
+		header = fits.Header()
+		header['XTENSION'] = ('BINTABLE','binary table extension')
+		header['BITPIX'] = 8
+		header['NAXIS'] = 2
+		header['NAXIS1'] = (self.dtype.itemsize,'width of table in bytes')
+		header['NAXIS2'] = (0,'number of rows in table')
+		header['PCOUNT'] = 0
+		header['GCOUNT'] = 1
+		header['TFIELDS'] = len(self.columns)
+		for i, (name, (tform, unit)) in enumerate(self.columns.items(),start=1):
+			header['TTYPE%d' % i] = name
+			header['TFORM%d' % i] = str(tform).strip().upper()
+			if unit not in (None,''):
+				header['TUNIT%d' % i] = unit
+			if name in self.tnulls:
+				header['TNULL%d' % i] = self.tnulls[name]
+		header['EXTNAME'] = extname
+
+		self.writer = open(self.outfits,'wb')
+		self.writer.write(fits.PrimaryHDU().header.tostring().encode('ascii'))
+		self.header_offset = self.writer.tell()
+		header_bytes = header.tostring().encode('ascii')
+		self.naxis2_offset = self.header_offset + header_bytes.index(b'NAXIS2  =')
+		self.writer.write(header_bytes)
+
+	def write(self,df):
+		""" append the rows of a DataFrame (missing cells: TNULL, NaN or na_string) """
+		records = np.zeros(len(df),dtype=self.dtype)
+		for name in self.dtype.names:
+			column = df[name]
+			kind = self.dtype[name].kind
+			if kind == 'S': # strings, and T/F of the logical columns
+				values = column.astype(object).where(column.notna(),self.na_string).astype(str)
+				records[name] = values.str.encode('utf-8').to_numpy(dtype=self.dtype[name])
+			elif name in self.tnulls:
+				records[name] = column.to_numpy(dtype=np.int64,na_value=self.tnulls[name])
+			elif kind == 'f':
+				records[name] = column.to_numpy(dtype=np.float64,na_value=np.nan)
+			else:
+				records[name] = column.to_numpy(dtype=self.dtype[name].newbyteorder('='),na_value=0)
+		self.writer.write(records.tobytes())
+		self.nrows += len(records)
+
+	def close(self):
+		self.writer.write(b'\0' * (-(self.dtype.itemsize * self.nrows) % FITS_BLOCK))
+		self.writer.seek(self.naxis2_offset)
+		self.writer.write(self.fits.Card('NAXIS2',self.nrows,'number of rows in table').image.encode('ascii'))
+		self.writer.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
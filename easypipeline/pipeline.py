@@ -2,97 +2,532 @@
 
 import os
 import sys 
+import time 
+import json 
 import yaml 
 import glob 
+import hashlib 
+import threading 
+import webbrowser 
 import pandas as pd 
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import easypipeline.cogamo as cogamo
+from easypipeline.server import StatusServer
+from easypipeline.database import PipelineDatabase
+from easypipeline.archive import HKArchive
+from easypipeline.stages import StageGraph, StageContext
+from easypipeline.fileutils import get_file_hash, get_file_fingerprint
+from easypipeline.fitswriter import check_tform
 
 yaml.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
     lambda loader, node: OrderedDict(loader.construct_pairs(node)))
 
-def replace_word_in_file(textfile,old_word,new_word):
-	with open(textfile) as reader:
-		content = reader.read()
-	content = content.replace(old_word,new_word)
-	with open(textfile, 'w') as writer:
+def write_text_atomic(textfile,content):
+	""" write to a temporary file and rename it, so that a reader never sees a partial file. """
+	tmpfile = '%s.tmp%d' % (textfile,os.getpid())
+	with open(tmpfile, 'w') as writer:
 		writer.write(content)
+	os.replace(tmpfile,textfile)
+
+def to_json_value(obj):
+	# numpy scalars in the column values 
+	if hasattr(obj,'item'):
+		return obj.item()
+	return str(obj)
+
+STATUS_BGCOLORS = OrderedDict([('Done','#00CC00'),('Error','#FF6666')])
+
+# pandas dtypes of the FITS TFORM codes (fitswriter.check_tform)
+TFORM_PANDAS_DTYPES = {'L':'boolean','B':'Int64','I':'Int64','J':'Int64','K':'Int64',
+	'E':'Float64','D':'Float64','A':'string'}
+
+def get_column_dtype(name,tform):
+	""" pandas dtype of a column from its FITS TFORM in def_columns.yaml. The 
+	missing cells are pd.NA, written as '--' in the csv and html tables. """
+	if name == 'Status':
+		return pd.CategoricalDtype(list(STATUS_BGCOLORS.keys()))
+	repeat, code = check_tform(tform)
+	return TFORM_PANDAS_DTYPES[code]
+
+def read_table_csv(csvpath,def_column_yaml,**kwargs):
+	""" read a csv table written by PipelineTable back with its column types 
+	(kwargs, e.g., chunksize, are passed to pd.read_csv) """
+	dtypes = OrderedDict([(name,get_column_dtype(name,column['format'])) for name, column in def_column_yaml.items()])
+	return pd.read_csv(csvpath,index_col=0,dtype=dtypes,na_values=['--'],keep_default_na=False,**kwargs)
+
+#### BEGIN: User can modify this ####
+## stages of each row, called as function(context, *results of the inputs) 
+## by stages.StageGraph, see "stages" in input_parameter.yaml
+def stage_load(context):
+	return cogamo.HKData(context.filepath,cachedir='%s/cache' % context.outdir,
+		param=context.param,flag_time_series=False)
+
+def stage_time_series(context,cgmhkfile):
+	cgmhkfile.make_time_series()
+	return cgmhkfile 
+
+def stage_stats(context,cgmhkfile):
+	context.set_values(cgmhkfile.set_stats_values(OrderedDict()))
+
+def stage_plot(context,cgmhkfile):
+	# the thumbnail is an output of the stage, made again with the plot
+	context.set_values(cgmhkfile.plot(context.outdir,OrderedDict(),flag_thumbnail_check=False))
+	context.add_outputs(cgmhkfile.outputs)
+
+def stage_plot_fresh(context):
+	values, outputs = cogamo.get_plot_values(context.outdir,context.basename,context.param)
+	context.set_values(values)
+	context.add_outputs(outputs)
+
+def stage_export(context,cgmhkfile):
+	if context.param.get('hk_archive') is not None:
+		HKArchive(context.param['hk_archive']).add_data(cgmhkfile)
+
+STAGE_FUNCTIONS = OrderedDict([
+	('load',stage_load),
+	('time_series',stage_time_series),
+	('stats',stage_stats),
+	('plot',stage_plot),
+	('export',stage_export)])
+
+# called instead of the stage when its outputs are up to date
+STAGE_FRESH_FUNCTIONS = {'plot':stage_plot_fresh}
+
+# stages of a parameter file without "stages", all run in each row
+DEFAULT_STAGES = OrderedDict([
+	('load',{}),
+	('time_series',{'inputs':['load']}),
+	('stats',{'inputs':['time_series']}),
+	('plot',{'inputs':['time_series']}),
+	('export',{'inputs':['time_series']})])
+#### END: User can modify this ####				
+
+def get_stage_graph(param,def_param=None):
+	""" StageGraph of the "stages" in the parameters (DEFAULT_STAGES if none) """
+	return StageGraph(param.get('stages') or DEFAULT_STAGES,STAGE_FUNCTIONS,
+		fresh_functions=STAGE_FRESH_FUNCTIONS,
+		reference_files=([def_param] if def_param is not None else []),
+		workers=param.get('stage_workers',1))
+
+def run_row(filepath,outdir,param=None,stages=None,graph=None,force=False):
+	"""
+	Process one row of the pipeline table, i.e., the stale stages (or all of 
+	them with force) of the stage graph, only the selected stages and the 
+	ones they need if stages is given. This function runs either in the 
+	main process or in a worker process, so it never touches the table itself; 
+	the column values and the status are returned to the parent instead, with 
+	the time when the row was started (e.g., picked up by a worker). 
+	"""
+	time_start = time.time()
+	param = param if param is not None else OrderedDict()
+	if graph is None:
+		graph = get_stage_graph(param)
+	context = StageContext(filepath,outdir,param)
+	status = '--'
+	try:
+		graph.run(context,targets=stages,force=force)
+	except Exception as e:
+		status = 'Error'
+	else:
+		status = 'Done'
+	return context.values, status, context.outputs, time_start, time.time() - time_start
 
 class PipelineTable(object):
-	def __init__(self,name,def_column,def_param,indir,outdir,flag_open=True):
+	def __init__(self,name,def_column,def_param,indir,outdir,flag_open=True,
+			flush_rows=1,flush_sec=None,refresh_sec=5,flag_database=False,stages=None):
 		self.name = name
 		self.def_column = def_column
 		self.def_param = def_param
 		self.indir = indir 
 		self.outdir = outdir
 		self.flag_open = flag_open
+
+		## flush policy of the summary table: every flush_rows rows or every 
+		## flush_sec seconds (None to disable either), and always on completion or error.
+		self.flush_rows = flush_rows
+		self.flush_sec = flush_sec
+		self.num_of_unflushed_rows = 0
+		self.last_flush_time = time.time()
+
+		## the html table reloads itself every refresh_sec seconds while the 
+		## pipeline is running with flag_realtime_open.
+		self.refresh_sec = refresh_sec 
+		self.flag_refresh = False 
+
+		## optional local status server pushing the row changes to the page
+		self.status_server = None 
+		self.lock = threading.RLock() # the server renders the table from its own threads
 		sys.stdout.write('=== Pipeline: %s generated === \n' % self.name)
 
 		## read def_column and add "--" initial values to the dict object
 		self.def_column_yaml = yaml.load(open(self.def_column),Loader=yaml.FullLoader)
-		self.cols_dict = OrderedDict()
-		for keyword in self.def_column_yaml.keys():
-			self.cols_dict[keyword] = []
-
+		self.param = yaml.load(open(self.def_param),Loader=yaml.FullLoader) or OrderedDict()
 		self.input_lst = sorted(glob.glob('%s/*.csv' % self.indir,recursive=True))
-		for infile in self.input_lst:
-			self.cols_dict['Filepath'].append(infile)
-			self.cols_dict['Filename'].append(os.path.basename(infile))
-			for key in self.cols_dict.keys():
-				if key in ('Filename','Filepath'):
-					continue
-				self.cols_dict[key].append('--')
 
-		## convert the table to the dataframe
-		self.df = pd.DataFrame.from_dict(self.cols_dict, orient='index').T
+		## stages run in each row, declared in def_param (see stages.py)
+		self.stage_graph = get_stage_graph(self.param,self.def_param)
+		self.stage_graph.select(stages) # unknown stages are reported here
+
+		## typed columns from the formats in def_column (K: Int64, nA: string, 
+		## Status: categorical), all missing (pd.NA, "--" in the tables) 
+		self.dtypes = OrderedDict()
+		for keyword, column in self.def_column_yaml.items():
+			self.dtypes[keyword] = get_column_dtype(keyword,column['format'])
+		self.df = pd.DataFrame(OrderedDict([(keyword,pd.Series(pd.NA,index=range(len(self.input_lst)),dtype=dtype)) 
+			for keyword, dtype in self.dtypes.items()]))
+		self.df['Filepath'] = pd.array(self.input_lst,dtype=self.dtypes['Filepath'])
+		self.df['Filename'] = pd.array([os.path.basename(infile) for infile in self.input_lst],dtype=self.dtypes['Filename'])
 
 		## prepare the output directory
 		if not os.path.exists(self.outdir):
-			cmd = 'mkdir -p %s/data' % self.outdir
-			print(cmd);os.system(cmd)
+			sys.stdout.write('mkdir -p %s/data\n' % self.outdir)
+			os.makedirs('%s/data' % self.outdir)
 
 		self.table_basename = '%s/%s' % (self.outdir,self.name)
 		self.table_csvpath = '%s.csv' % self.table_basename
 		self.table_htmlpath = '%s.html'	% self.table_basename
 		self.num_of_rows = len(self.df)
 
-	def write(self,overwrite=True):
-		if overwrite:
-			cmd = 'rm -f %s %s' % (self.table_csvpath,self.table_htmlpath)
-			os.system(cmd);#print(cmd);
-		self.df.to_csv(self.table_csvpath)
-		self.df.to_html(self.table_htmlpath,render_links=True, escape=False)
+		## run manifest: input fingerprints, parameter hash and outputs of each row, 
+		## used to skip the unchanged rows in the next run.
+		self.manifest_path = '%s_manifest.json' % self.table_basename
+		self.param_hash = get_file_hash(self.def_param)
+		## stages of each row (None for all), a row done with other stages is run again
+		self.stages = stages 
+		if self.stages is not None:
+			self.param_hash = hashlib.sha256(('%s %s' % (self.param_hash,','.join(self.stages))).encode()).hexdigest()
+		self.fingerprints = {}
+
+		## append-only journal of the row transitions (queued, started, done, error). 
+		## The manifest and the csv and html tables are views materialised 
+		## from it, so a restarted run rebuilds its state by replaying it.
+		self.journal_path = '%s_journal.jsonl' % self.table_basename
+		self.journal = None 
+		self.pending = OrderedDict() # queued or started records of the rows not finished yet
+		self.manifest = self.read_journal()
+		self.database = None 
+		self.materialise()
+
+		## optional SQLite copy of the table with typed and indexed columns
+		if flag_database:
+			self.database_path = '%s.sqlite' % self.table_basename
+			self.database = PipelineDatabase(self.database_path,self.def_column_yaml)
+			self.database.insert_rows(self.df)
+			self.database.commit()
+
+	def read_manifest(self):
+		if not os.path.exists(self.manifest_path):
+			return OrderedDict()
+		try:
+			with open(self.manifest_path) as reader:
+				return json.load(reader,object_pairs_hook=OrderedDict)
+		except ValueError as e:
+			sys.stderr.write('[warning] broken manifest {} is ignored.\n'.format(self.manifest_path))
+			return OrderedDict()
+
+	def read_journal(self):
+		""" replay the journal into the manifest, i.e., the last done or 
+		error record of each input file. """
+		if not os.path.exists(self.journal_path):
+			return self.read_manifest() # outdir made before the journal
+		manifest = OrderedDict()
+		started = OrderedDict() # queued or started, and not finished 
+		with open(self.journal_path) as reader:
+			for line in reader:
+				try:
+					record = json.loads(line,object_pairs_hook=OrderedDict)
+				except ValueError as e:
+					continue # a line cut by a crash, only this record is lost
+				if record['event'] in ('queued','started'):
+					started[record['filepath']] = record 
+				elif record['event'] in ('done','error'):
+					started.pop(record['filepath'],None)
+					manifest[record['filepath']] = OrderedDict([
+						('input',record['input']),
+						('param_hash',record['param_hash']),
+						('status',record['status']),
+						('values',record['values']),
+						('outputs',record['outputs'])])
+		for filepath in started:
+			# interrupted while its outputs were being remade, so run it again 
+			if filepath in manifest:
+				manifest[filepath]['status'] = '--'
+		if len(started) > 0:
+			sys.stdout.write('Pipeline {}: #_of_interrupted_rows = {}\n'.format(sys._getframe().f_code.co_name,len(started)))
+		return manifest 
+
+	def append_journal(self,event,**kwargs):
+		""" append one record and flush it, so that it survives the process. """
+		if self.journal is None:
+			self.journal = open(self.journal_path,'a+')
+			# terminate a line cut by a crash before appending to it 
+			if self.journal.tell() > 0:
+				self.journal.seek(self.journal.tell()-1)
+				if self.journal.read(1) != '\n':
+					self.journal.write('\n')
+		record = OrderedDict([('event',event),('time',time.time())])
+		record.update(kwargs)
+		self.journal.write(json.dumps(record,default=to_json_value) + '\n')
+		self.journal.flush()
+		return record 
 
-		replace_word_in_file(self.table_htmlpath,'<td>Done</td>','<td bgcolor="#00CC00">Done</td>')
-		replace_word_in_file(self.table_htmlpath,'<td>Error</td>','<td bgcolor="#FF6666">Error</td>')
+	def compact_journal(self):
+		""" rewrite the journal as one done or error record per input file (the 
+		manifest), followed by the records of the rows still queued or started 
+		(interrupted), so that its replay does not grow with the history. """
+		self.close_journal()
+		lines = []
+		for filepath, entry in self.manifest.items():
+			record = OrderedDict([('event','done' if entry['status'] == 'Done' else 'error'),
+				('time',time.time()),('filepath',filepath)])
+			record.update(entry)
+			lines.append(json.dumps(record,default=to_json_value) + '\n')
+		for record in self.pending.values():
+			lines.append(json.dumps(record,default=to_json_value) + '\n')
+		write_text_atomic(self.journal_path,''.join(lines))
 
-	def run_pipeline(self,flag_realtime_open=True):
+	def close_journal(self):
+		if self.journal is not None:
+			self.journal.close()
+			self.journal = None 
+
+	def materialise(self):
+		""" fill the table with the last known state of each row """
+		for index, filepath in enumerate(self.df['Filepath']):
+			entry = self.manifest.get(filepath)
+			if entry is not None:
+				self.set_row(index,entry['values'],entry['status'])
+
+	def write_manifest(self):
+		""" snapshot of the manifest, written once at the end of a run (the 
+		journal is written row by row instead) """
+		write_text_atomic(self.manifest_path,
+			json.dumps(self.manifest,indent=1,default=to_json_value))
+
+	def is_up_to_date(self,index):
+		""" True if the row was done with the same input and parameter files 
+		and all its outputs still exist. """
+		filepath = self.df.iloc[index]['Filepath']
+		entry = self.manifest.get(filepath)
+		self.fingerprints[index] = get_file_fingerprint(filepath,
+			previous=(entry['input'] if entry is not None else None))
+		if entry is None or entry['status'] != 'Done':
+			return False 
+		if entry['param_hash'] != self.param_hash:
+			return False 
+		if entry['input']['sha256'] != self.fingerprints[index]['sha256']:
+			return False 
+		for output in entry['outputs']:
+			if not os.path.exists(output):
+				return False 
+		return True 
+
+	def restore_row(self,index):
+		entry = self.manifest[self.df.iloc[index]['Filepath']]
+		entry['input'] = self.fingerprints[index] # e.g., touched but not modified
+		self.set_row(index,entry['values'],entry['status'])
+
+	def queue_row(self,index):
+		""" a row submitted to the worker processes, started when a worker picks it up """
+		filepath = self.df.iloc[index]['Filepath']
+		self.pending[filepath] = self.append_journal('queued',index=index,filepath=filepath)
+
+	def start_row(self,index,time_start=None):
+		""" time_start: when a worker started the row (default: now) """
+		kwargs = {} if time_start is None else {'time':time_start}
+		filepath = self.df.iloc[index]['Filepath']
+		self.pending[filepath] = self.append_journal('started',index=index,filepath=filepath,**kwargs)
+
+	def update_manifest(self,index,values,status,outputs,elapsed=None):
+		filepath = self.df.iloc[index]['Filepath']
+		self.append_journal('done' if status == 'Done' else 'error',
+			index=index,filepath=filepath,elapsed=elapsed,
+			input=self.fingerprints[index],param_hash=self.param_hash,
+			status=status,values=values,outputs=list(outputs))
+		self.pending.pop(filepath,None)
+		self.manifest[filepath] = OrderedDict([
+			('input',self.fingerprints[index]),
+			('param_hash',self.param_hash),
+			('status',status),
+			('values',values),
+			('outputs',list(outputs))])
+
+	def render_html(self):
+		with self.lock:
+			# na_rep is not applied to the extension dtypes by to_html
+			html = self.df.astype(object).where(self.df.notna(),'--').to_html(render_links=True, escape=False)
+		for status, bgcolor in STATUS_BGCOLORS.items():
+			html = html.replace('<td>%s</td>' % status,'<td bgcolor="%s">%s</td>' % (bgcolor,status))
+		return html 
+
+	def write(self):
+		with self.lock:
+			content = self.df.to_csv(na_rep='--')
+		write_text_atomic(self.table_csvpath,content)
+
+		html = self.render_html()
+		if self.flag_refresh:
+			html = '<meta http-equiv="refresh" content="%d">\n%s' % (self.refresh_sec,html)
+		write_text_atomic(self.table_htmlpath,html)
+		if self.database is not None:
+			self.database.commit()
+
+		self.num_of_unflushed_rows = 0
+		self.last_flush_time = time.time()
+
+	def flush(self,force=False):
+		""" write the table if the flush policy says so. Returns True when written. """
+		if not force:
+			if self.num_of_unflushed_rows == 0:
+				return False 
+			flag_rows = self.flush_rows is not None and self.num_of_unflushed_rows >= self.flush_rows
+			flag_sec = self.flush_sec is not None and time.time() - self.last_flush_time >= self.flush_sec
+			if not (flag_rows or flag_sec):
+				return False 
+		self.write()
+		return True 
+
+	def to_cell_value(self,key,value):
+		""" cast a value to the type of the column, '--' to pd.NA """
+		if value is None or (isinstance(value,str) and value == '--'):
+			return pd.NA 
+		dtype = self.dtypes[key]
+		try:
+			if dtype == 'Int64':
+				return int(value)
+			elif dtype == 'Float64':
+				return float(value)
+			elif dtype == 'boolean':
+				return bool(value)
+		except (TypeError, ValueError) as e:
+			sys.stderr.write('[warning] {} of {} is not {}, set to "--".\n'.format(value,key,dtype))
+			return pd.NA 
+		return str(value)
+
+	def set_cell(self,index,key,value):
+		value = self.to_cell_value(key,value)
+		if isinstance(self.dtypes[key],pd.CategoricalDtype) and value is not pd.NA \
+				and value not in self.df[key].cat.categories:
+			self.df[key] = self.df[key].cat.add_categories([value])
+			self.dtypes[key] = self.df[key].dtype 
+		self.df.at[index,key] = value 
+
+	def get_cell_values(self,index,keys):
+		""" typed cells of the row as json values, '--' for the missing ones 
+		(pd.NA, NaN), as shown in the html table """
+		values = OrderedDict()
+		with self.lock:
+			for key in keys:
+				value = self.df.at[index,key]
+				if pd.isna(value):
+					value = '--'
+				elif hasattr(value,'item'):
+					value = value.item() # numpy scalars 
+				values[key] = value 
+		return values 
+
+	def set_row(self,index,values,status=None):
+		with self.lock:
+			for key, value in values.items():
+				if key in self.df.columns:
+					self.set_cell(index,key,value)
+			if status is not None:
+				self.set_cell(index,'Status',status)
+		if self.status_server is not None or self.database is not None:
+			changes = OrderedDict([(key,value) for key, value in values.items() if key in self.df.columns])
+			if status is not None:
+				changes['Status'] = status 
+			if self.status_server is not None:
+				self.status_server.publish(index,self.get_cell_values(index,changes.keys()))
+			if self.database is not None:
+				self.database.update_row(index,changes)
+
+	def start_status_server(self,port=8000):
+		self.status_server = StatusServer(self,port=port,bgcolors=STATUS_BGCOLORS)
+		self.status_server.start()
+
+	def finish_row(self,index,values,status,outputs,elapsed=None):
+		sys.stdout.write('-- status: {}\n'.format(status))
+		self.set_row(index,values,status)
+		self.update_manifest(index,values,status,outputs,elapsed)
+		self.num_of_unflushed_rows += 1
+		self.flush(force=(status=='Error'))
+
+	def run_pipeline(self,flag_realtime_open=True,workers=1,force=False,status_port=None):
 		sys.stdout.write('Pipeline {}: #_of_rows = {}  \n'.format(sys._getframe().f_code.co_name,self.num_of_rows))
 
-		# make initial table 
+		# skip the rows whose inputs and parameters did not change 
+		index_list = []
+		for index in range(self.num_of_rows):
+			if not force and self.is_up_to_date(index):
+				self.restore_row(index)
+			else:
+				index_list.append(index)
+		sys.stdout.write('Pipeline {}: #_of_skipped_rows = {} (unchanged)\n'.format(sys._getframe().f_code.co_name,self.num_of_rows-len(index_list)))
+		if force:
+			for index in index_list:
+				self.fingerprints[index] = get_file_fingerprint(self.df.iloc[index]['Filepath'])
+		for index in index_list:
+			self.set_row(index,{},'--') # the last state is kept in the journal
+		self.append_journal('run',param_hash=self.param_hash,
+			num_of_rows=self.num_of_rows,num_of_queued_rows=len(index_list))
+
+		# make initial table, which reloads itself while the pipeline runs, 
+		# and open it only once. With the status server, the page is served 
+		# once and the row changes are pushed to it instead. 
+		if status_port is not None:
+			self.start_status_server(status_port)
+		self.flag_refresh = flag_realtime_open and self.status_server is None 
 		self.write() # write the initial table 
-		os.system('open %s ' % self.table_htmlpath)
+		if flag_realtime_open:
+			if self.status_server is not None:
+				webbrowser.open(self.status_server.url)
+			else:
+				webbrowser.open('file://%s' % os.path.abspath(self.table_htmlpath))
 
 		# start the main loop 
-		for index in range(self.num_of_rows):
-			#print(self.df.iloc[index])
-			sys.stdout.write('-- {}/{} process started.\n'.format(index,self.num_of_rows))
-
-			#### BEGIN: User can modify this ####
-			status = '--'
-			try:
-				cgmhkfile = cogamo.HKData(self.df.iloc[index]['Filepath'])
-				cgmhkfile.run(self,index)	
-			except Exception as e:
-				status = 'Error'
-			else:
-				status = 'Done'
-			finally:
-				sys.stdout.write('-- status: {}\n'.format(status))
-				self.df.iloc[index]['Status'] = status 
+		try:
+			self.run_rows(index_list,workers,force)
+		finally:
+			# on completion, or when the loop is interrupted; the final 
+			# table stops reloading. 
+			if self.num_of_unflushed_rows > 0 or self.flag_refresh:
+				self.flag_refresh = False 
 				self.write()
-				if flag_realtime_open: os.system('open %s ' % self.table_htmlpath)
-			#### END: User can modify this ####				
-
+			if self.status_server is not None:
+				self.status_server.stop() # after the done event is sent 
+				self.status_server = None 
+			self.compact_journal()
+			self.write_manifest()
+			if self.database is not None:
+				self.database.commit()
 
+	def run_rows(self,index_list,workers=1,force=False):
+		if workers > 1:
+			# only the parent process writes the table, the workers send back 
+			# their column values and status.
+			with ProcessPoolExecutor(max_workers=workers) as executor:
+				futures = {}
+				for index in index_list:
+					sys.stdout.write('-- {}/{} process submitted.\n'.format(index,self.num_of_rows))
+					future = executor.submit(run_row,self.df.iloc[index]['Filepath'],self.outdir,self.param,self.stages,self.stage_graph,force)
+					futures[future] = index 
+					self.queue_row(index)
+				for future in as_completed(futures):
+					index = futures[future]
+					try:
+						values, status, outputs, time_start, elapsed = future.result()
+					except Exception as e:
+						values, status, outputs, time_start, elapsed = OrderedDict(), 'Error', [], None, None
+					if time_start is not None:
+						self.start_row(index,time_start)
+					self.finish_row(index,values,status,outputs,elapsed)
+		else:
+			for index in index_list:
+				#print(self.df.iloc[index])
+				sys.stdout.write('-- {}/{} process started.\n'.format(index,self.num_of_rows))
+				self.start_row(index)
+				values, status, outputs, time_start, elapsed = run_row(self.df.iloc[index]['Filepath'],self.outdir,self.param,self.stages,self.stage_graph,force)
+				self.finish_row(index,values,status,outputs,elapsed)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import threading
+from functools import partial
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+STATUS_PAGE_SCRIPT = """
+<script>
+var bgcolors = %s;
+var source = new EventSource('/events?since=%d');
+source.onmessage = function(event) {
+	var data = JSON.parse(event.data);
+	var table = document.querySelector('table.dataframe');
+	var headers = Array.from(table.tHead.rows[0].cells).map(function(cell) { return cell.textContent; });
+	var row = table.tBodies[0].rows[data.index];
+	for (var key in data.values) {
+		var i = headers.indexOf(key);
+		if (i < 0) continue;
+		row.cells[i].innerHTML = data.values[key];
+		if (key == 'Status') row.cells[i].setAttribute('bgcolor', bgcolors[data.values[key]] || '');
+	}
+};
+source.addEventListener('done', function(event) { source.close(); });
+</script>
+"""
+
+class StatusRequestHandler(SimpleHTTPRequestHandler):
+	"""
+	"/" returns the current table, "/events" streams the row-status changes
+	as server-sent events, and the other paths are the output files (e.g., the
+	QL plots linked from the table).
+	"""
+	def __init__(self, *args, status_server=None, **kwargs):
+		self.status_server = status_server
+		super().__init__(*args, **kwargs)
+
+	def log_message(self, format, *args):
+		pass
+
+	def do_GET(self):
+		url = urlparse(self.path)
+		if url.path in ('/','/index.html'):
+			self.send_page()
+		elif url.path == '/events':
+			self.send_events(parse_qs(url.query))
+		else:
+			super().do_GET()
+
+	def send_page(self):
+		content = self.status_server.render_page().encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type','text/html; charset=utf-8')
+		self.send_header('Content-Length',str(len(content)))
+		self.end_headers()
+		self.wfile.write(content)
+
+	def send_events(self,query):
+		since = int(query.get('since',['0'])[0])
+		if self.headers.get('Last-Event-ID') is not None:
+			since = int(self.headers.get('Last-Event-ID')) + 1
+		self.send_response(200)
+		self.send_header('Content-Type','text/event-stream')
+		self.send_header('Cache-Control','no-cache')
+		self.end_headers()
+		self.status_server.open_stream()
+		try:
+			while True:
+				events, flag_done = self.status_server.wait_events(since)
+				for event in events:
+					self.wfile.write(('id: %d\ndata: %s\n\n' % (since,event)).encode('utf-8'))
+					since += 1
+				if not events:
+					self.wfile.write(b': keepalive\n\n')
+				if flag_done:
+					self.wfile.write(b'event: done\ndata: \n\n')
+					self.wfile.flush()
+					break
+				self.wfile.flush()
+		except (BrokenPipeError, ConnectionResetError) as e:
+			pass
+		finally:
+			self.status_server.close_stream()
+
+class StatusServer(object):
+	"""
+	Local (127.0.0.1 only) HTTP status endpoint of a PipelineTable. The table
+	is served once and then each row-status change is pushed to the page,
+	instead of re-rendering the html file and reloading the browser.
+	"""
+	def __init__(self,piptable,port=8000,bgcolors={},keepalive_sec=15):
+		self.piptable = piptable
+		self.port = port
+		self.bgcolors = bgcolors # background colors of the Status cells
+		self.keepalive_sec = keepalive_sec
+		self.events = [] # json strings, the event id is the list index
+		self.flag_done = False
+		self.num_of_streams = 0 # open event streams 
+		self.condition = threading.Condition()
+
+		# the links in the table are relative to the html file in outdir
+		# ("../outdir/data/..."), so the files are served from its parent.
+		handler = partial(StatusRequestHandler,status_server=self,
+			directory=os.path.dirname(os.path.abspath(self.piptable.outdir)))
+		self.httpd = ThreadingHTTPServer(('127.0.0.1',self.port),handler)
+		self.httpd.daemon_threads = True
+		self.thread = threading.Thread(target=self.httpd.serve_forever,daemon=True)
+
+	@property
+	def url(self):
+		return 'http://127.0.0.1:%d/' % self.httpd.server_address[1]
+
+	def start(self):
+		self.thread.start()
+		sys.stdout.write('Pipeline status server: {}\n'.format(self.url))
+
+	def render_page(self):
+		with self.condition:
+			since = len(self.events)
+		return '%s\n%s' % (self.piptable.render_html(),
+			STATUS_PAGE_SCRIPT % (json.dumps(self.bgcolors),since))
+
+	def publish(self,index,values):
+		""" values: json values of the cells, without NaN, which JSON.parse rejects """
+		event = json.dumps({'index':int(index),'values':values},default=str,allow_nan=False)
+		with self.condition:
+			self.events.append(event)
+			self.condition.notify_all()
+
+	def wait_events(self,since):
+		with self.condition:
+			if since >= len(self.events) and not self.flag_done:
+				self.condition.wait(timeout=self.keepalive_sec)
+			return self.events[since:], self.flag_done
+
+	def open_stream(self):
+		with self.condition:
+			self.num_of_streams += 1
+
+	def close_stream(self):
+		with self.condition:
+			self.num_of_streams -= 1
+			self.condition.notify_all()
+
+	def done(self):
+		with self.condition:
+			self.flag_done = True
+			self.condition.notify_all()
+
+	def stop(self,timeout=5.0):
+		""" send the done event, wait (up to timeout seconds) until the open 
+		event streams have sent it, and close the socket """
+		self.done()
+		with self.condition:
+			self.condition.wait_for(lambda: self.num_of_streams <= 0,timeout=timeout)
+		self.httpd.shutdown()
+		self.httpd.server_close()
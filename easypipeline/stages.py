@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class StageContext(object):
+	"""
+	State of one row (input file) shared by its stages: the column values of
+	the pipeline table and the output files recorded in the run manifest.
+	"""
+	def __init__(self,filepath,outdir,param=None):
+		self.filepath = filepath
+		self.outdir = outdir
+		self.param = param if param is not None else {}
+		self.basename = os.path.splitext(os.path.basename(self.filepath))[0]
+		self.values = OrderedDict()
+		self.outputs = []
+		self.lock = threading.Lock() # stages running in threads
+
+	def format(self,template):
+		""" path of an output template, e.g., '{outdir}/data/{basename}/{basename}.{ql_format}',
+		the keys are outdir, basename and the parameters """
+		keys = dict(self.param)
+		keys.update(outdir=self.outdir,basename=self.basename)
+		try:
+			return template.format(**keys)
+		except KeyError as e:
+			raise ValueError('unknown key {} in the output {}'.format(e,template))
+
+	def set_values(self,values):
+		with self.lock:
+			self.values.update(values)
+
+	def add_outputs(self,outputs):
+		with self.lock:
+			for output in outputs:
+				if output not in self.outputs:
+					self.outputs.append(output)
+
+class Stage(object):
+	def __init__(self,name,function,inputs=None,outputs=None,fresh_function=None):
+		self.name = name
+		self.function = function # function(context, *results of the inputs)
+		self.inputs = inputs if inputs is not None else [] # names of the input stages
+		# templates of the output files, or {path: template, when: parameter} 
+		# for a file written only when the parameter is true
+		self.outputs = outputs if outputs is not None else [] 
+		self.fresh_function = fresh_function # function(context), when the outputs are up to date
+
+class StageGraph(object):
+	"""
+	DAG of the stages run for each row, declared in the parameter yamlfile:
+	  stages:
+	    <name>:
+	      function: <key of functions> (default: the name of the stage)
+	      inputs: [<stages whose results are passed to this stage>]
+	      outputs: [<templates of the files written by this stage>]
+	An output written only when a parameter is true is declared as
+	{path: <template>, when: <parameter>}, and ignored when it is false.
+	A stage with outputs is stale when one of them is missing or older than
+	the input file, the reference files (the parameter file) or the outputs
+	of its inputs, or when one of its inputs is stale. Only the selected stages
+	which are stale or without outputs are run, with the stages they need; the
+	other ones are skipped, and their fresh_function fills the table instead.
+	Independent stages of a row are run concurrently with workers > 1.
+	"""
+	def __init__(self,stages_yaml,functions,fresh_functions=None,reference_files=None,workers=1):
+		self.reference_files = reference_files if reference_files is not None else []
+		self.workers = workers
+		fresh_functions = fresh_functions if fresh_functions is not None else {}
+
+		self.stages = OrderedDict()
+		for name, stage_yaml in stages_yaml.items():
+			stage_yaml = stage_yaml if stage_yaml is not None else {}
+			function_name = stage_yaml.get('function',name)
+			if function_name not in functions:
+				raise ValueError('unknown function {} of the stage {} (choose from {})'.format(
+					function_name,name,','.join(functions.keys())))
+			self.stages[name] = Stage(name,functions[function_name],
+				inputs=list(stage_yaml.get('inputs') or []),
+				outputs=list(stage_yaml.get('outputs') or []),
+				fresh_function=fresh_functions.get(function_name))
+		for stage in self.stages.values():
+			for name in stage.inputs:
+				if name not in self.stages:
+					raise ValueError('unknown input {} of the stage {}'.format(name,stage.name))
+			for output in stage.outputs:
+				if isinstance(output,dict) and 'path' not in output:
+					raise ValueError('output {} of the stage {} without path'.format(output,stage.name))
+		self.order = self.sort()
+
+	def sort(self):
+		""" topological order of the stages, in the declared order where it is free """
+		order = []
+		while len(order) < len(self.stages):
+			ready = [name for name, stage in self.stages.items()
+				if name not in order and all([input_name in order for input_name in stage.inputs])]
+			if len(ready) == 0:
+				raise ValueError('cycle in the stages: {}'.format(
+					','.join([name for name in self.stages if name not in order])))
+			order.append(ready[0])
+		return order
+
+	def select(self,targets=None):
+		""" the target stages (None for all) and the stages they depend on """
+		if targets is None:
+			return list(self.order)
+		selected = set()
+		pending = list(targets)
+		while len(pending) > 0:
+			name = pending.pop()
+			if name not in self.stages:
+				raise ValueError('unknown stage {} (choose from {})'.format(name,','.join(self.order)))
+			if name not in selected:
+				selected.add(name)
+				pending.extend(self.stages[name].inputs)
+		return [name for name in self.order if name in selected]
+
+	def get_outputs(self,name,context):
+		""" paths of the outputs of the stage, without the conditional ones 
+		whose parameter is false """
+		outputs = []
+		for output in self.stages[name].outputs:
+			if isinstance(output,dict):
+				if 'when' in output and not context.param.get(output['when']):
+					continue 
+				output = output['path']
+			outputs.append(context.format(output))
+		return outputs 
+
+	def is_fresh(self,name,context,reference_time):
+		""" True if all the outputs exist and are newer than reference_time and
+		the outputs of the inputs. """
+		for input_name in self.stages[name].inputs:
+			for path in self.get_outputs(input_name,context):
+				if os.path.exists(path):
+					reference_time = max(reference_time,os.path.getmtime(path))
+		for path in self.get_outputs(name,context):
+			if not os.path.exists(path) or os.path.getmtime(path) < reference_time:
+				return False
+		return True
+
+	def plan(self,context,targets=None,force=False):
+		""" names of the stages to be run and skipped for the row, in order """
+		selected = self.select(targets)
+		targets = selected if targets is None else targets
+		reference_time = max([os.path.getmtime(path) for path in [context.filepath] + self.reference_files])
+
+		stale = OrderedDict()
+		for name in selected:
+			stage = self.stages[name]
+			stale[name] = force or any([stale[input_name] for input_name in stage.inputs]) \
+				or (len(self.get_outputs(name,context)) > 0 and not self.is_fresh(name,context,reference_time))
+
+		needed = set()
+		for name in reversed(selected):
+			stage = self.stages[name]
+			if name in needed or (name in targets and (stale[name] or len(self.get_outputs(name,context)) == 0)):
+				needed.add(name)
+				needed.update(stage.inputs)
+		run_list = [name for name in selected if name in needed]
+		skip_list = [name for name in selected if name in targets and name not in needed]
+		return run_list, skip_list
+
+	def run_stage(self,name,context,results):
+		stage = self.stages[name]
+		sys.stdout.write('-- Stage {}: {}\n'.format(context.basename,name))
+		return stage.function(context,*[results[input_name] for input_name in stage.inputs])
+
+	def run(self,context,targets=None,force=False):
+		""" run the stale stages of a row (all of them with force) """
+		run_list, skip_list = self.plan(context,targets,force)
+		for name in skip_list:
+			sys.stdout.write('-- Stage {}: {} skipped (up to date)\n'.format(context.basename,name))
+			if self.stages[name].fresh_function is not None:
+				self.stages[name].fresh_function(context)
+			context.add_outputs(self.get_outputs(name,context))
+
+		results = {}
+		if self.workers <= 1:
+			for name in run_list:
+				results[name] = self.run_stage(name,context,results)
+			return context
+
+		# a stage is submitted when all its inputs are done; on an error,
+		# the running stages are waited for and the rest is not started
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			pending = list(run_list)
+			futures = {}
+			while len(pending) > 0 or len(futures) > 0:
+				for name in list(pending):
+					if all([input_name in results for input_name in self.stages[name].inputs]):
+						pending.remove(name)
+						futures[executor.submit(self.run_stage,name,context,results)] = name
+				done, not_done = wait(futures,return_when=FIRST_COMPLETED)
+				for future in done:
+					results[futures.pop(future)] = future.result()
+		return context
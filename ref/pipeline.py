@@ -6,11 +6,11 @@ import glob
 import yaml
 import numpy as np 
 import pandas as pd 
+import math
 import matplotlib.pylab as plt 
 
-from iminuit import Minuit
+# iminuit and probfit are imported by EventFile.search_burst(method='minuit')
 #from probfit import BinnedChi2
-from probfit import Chi2Regression
 
 
 FONTSIZE = 18
@@ -25,26 +25,241 @@ def model_gauss(x, mu, sigma, area):
 def model_gauss_continuum(x, mu, sigma, area, c0=0.0, c1=0.0):
     return area * np.exp(-0.5*(x-mu)**2/sigma**2)/(np.sqrt(2*np.pi)*sigma) + c0 + c1 * x 
 
+def estimate_gauss_clipped(x, nsigma=2.0, maxiter=20):
+	"""
+	mean and standard deviation of the Gaussian core of the values (e.g., 
+	the rates of a light curve with bursts) by sigma clipping: the values 
+	within nsigma of the mean are kept until the selection does not change. 
+	The standard deviation is corrected for the cut tails of the Gaussian. 
+	Returns mu, sigma and the number of the kept values.
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	# variance of a Gaussian truncated at +-nsigma, in units of sigma**2
+	truncated = 1.0 - 2.0 * nsigma * math.exp(-0.5 * nsigma**2) / math.sqrt(2 * math.pi) / math.erf(nsigma / math.sqrt(2))
+	mask = np.ones(len(x), dtype=bool)
+	for i in range(maxiter):
+		mu = np.mean(x[mask])
+		sigma = np.std(x[mask]) / math.sqrt(truncated) 
+		new_mask = np.abs(x - mu) <= nsigma * sigma 
+		if np.array_equal(new_mask, mask) or not new_mask.any():
+			break 
+		mask = new_mask 
+	return mu, sigma, int(np.sum(mask))
+
+def bin_index_in_range(x, nbins, xlow, xhigh, edges=None):
+	"""
+	Index of the uniform bin of each value in xlow <= x <= xhigh, with the 
+	edges of np.histogram(x, bins=nbins, range=(xlow, xhigh)) and its closed 
+	last bin. Integer values in bins of an integer width are binned with an 
+	integer division, the other ones as np.histogram does.
+	"""
+	width = (xhigh - xlow) / nbins 
+	if x.dtype.kind in ('i','u') and float(xlow).is_integer() and width.is_integer() and width >= 1:
+		index = ((x - int(xlow)) // int(width)).astype(np.intp, copy=False)
+		index[index == nbins] -= 1 # x == xhigh
+		return index 
+	if edges is None:
+		edges = np.linspace(xlow, xhigh, nbins + 1)
+	index = ((x - xlow) * (nbins / (xhigh - xlow))).astype(np.intp)
+	# rounding at the edges, as np.histogram does
+	index[index == nbins] -= 1
+	index[x < edges[index]] -= 1
+	index[np.logical_and(x >= edges[index + 1], index != nbins - 1)] += 1
+	return index 
+
+def to_pha_limit(value):
+	return None if value is None or value == 'None' else value
+
+def get_pha_suffix(pha_min, pha_max):
+	if pha_min == None and pha_max == None:
+		return 'pha_all' 
+	elif pha_min != None and pha_max == None:
+		return 'pha_%d_xx' % (pha_min)
+	elif pha_min == None and pha_max != None:
+		return 'pha_xx_%d' % (pha_max)
+	else:
+		return 'pha_%d_%d' % (pha_min,pha_max)
+
+# number of values binned at once by Hist1D.fill
+HIST_BLOCK = 2**16
+
+class HistBuffers(object):
+	"""
+	Work arrays of HIST_BLOCK values reused by every block of Hist1D.fill: 
+	the masks, the bin indices and the float scratch of the index are 
+	computed in place (out=) instead of as new temporaries. The values out 
+	of the range are not removed but binned in an overflow bin (index nbins), 
+	which is dropped after np.bincount.
+	"""
+	def __init__(self, size=HIST_BLOCK):
+		self.outside = np.empty(size, dtype=bool)
+		self.mask = np.empty(size, dtype=bool)
+		self.index = np.empty(size, dtype=np.intp)
+		self.index1 = np.empty(size, dtype=np.intp)
+		self.scaled = np.empty(size, dtype=np.float64)
+		self.edge = np.empty(size, dtype=np.float64)
+		self.weights2 = np.empty(size, dtype=np.float64)
+
 class Hist1D(object):
+	"""
+	Histogram of nbins uniform bins in xlow <= x <= xhigh (the edges and the 
+	closed last bin of np.histogram), filled incrementally, e.g., chunk by 
+	chunk: the bin of each value is computed directly (get_block_index, as 
+	bin_index_in_range) in reusable block buffers (HistBuffers) and 
+	accumulated with np.bincount into hist. np.bincount has no out argument, 
+	so each block still allocates its small result of nbins + 1 counts 
+	(test/bench_hist1d.py). With weights, hist is the sum of the weights and 
+	sumw2 the sum of their squares, the errors are sqrt(sumw2) instead of 
+	sqrt(hist). Histograms of the same bins are merged with merge() or +.
+	"""
 	def __init__(self, nbins, xlow, xhigh):
-		self.nbins = nbins
+		self.nbins = int(nbins)
 		self.xlow  = xlow
 		self.xhigh = xhigh
-		#print(self.nbins,self.xlow,self.xhigh)
-		self.hist, edges = np.histogram([], bins=nbins, range=(xlow, xhigh))
-		self.bins = (edges[:-1] + edges[1:]) / 2.
-		#print(self.hist,edges,self.bins)
+		self.edges = np.linspace(xlow, xhigh, self.nbins + 1)
+		self.bins = (self.edges[:-1] + self.edges[1:]) / 2.
+		self.hist = np.zeros(self.nbins, dtype=np.int64)
+		self.sumw2 = None # with weighted fills
+		self.buffers = None # HistBuffers, at the first fill
+
+	def fill(self, arr, weights=None):
+		arr = np.asarray(arr)
+		if weights is not None:
+			weights = np.asarray(weights, dtype=np.float64)
+			if self.sumw2 is None:
+				self.hist = self.hist.astype(np.float64) 
+				self.sumw2 = self.hist.copy() # the unit weights so far
+		# in blocks, so that the work arrays stay small and in the cache
+		for start in range(0, len(arr), HIST_BLOCK):
+			self.fill_block(arr[start:start+HIST_BLOCK],
+				None if weights is None else weights[start:start+HIST_BLOCK])
+
+	def get_block_index(self, arr):
+		""" 
+		bin index of each value of a block (at most HIST_BLOCK values) in the 
+		buffers, nbins for the values out of the range 
+		"""
+		if self.buffers is None:
+			self.buffers = HistBuffers()
+		size = len(arr)
+		buffers = self.buffers 
+		outside = buffers.outside[:size]
+		mask = buffers.mask[:size]
+		index = buffers.index[:size]
+		np.greater_equal(arr, self.xlow, out=outside)
+		np.less_equal(arr, self.xhigh, out=mask)
+		np.logical_and(outside, mask, out=outside)
+		np.logical_not(outside, out=outside) # also nan
+		flag_outside = outside.any()
+		width = (self.xhigh - self.xlow) / self.nbins 
+		if arr.dtype.kind in ('i','u') and float(self.xlow).is_integer() and width.is_integer() and width >= 1:
+			np.subtract(arr, int(self.xlow), out=index, dtype=np.intp, casting='unsafe')
+			np.floor_divide(index, int(width), out=index)
+		else:
+			# float index and the rounding at the edges, as np.histogram does 
+			# (mode='clip' keeps the edges of index -1 and nbins + 1 in range)
+			scaled = buffers.scaled[:size]
+			edge = buffers.edge[:size]
+			index1 = buffers.index1[:size]
+			np.subtract(arr, self.xlow, out=scaled, dtype=np.float64, casting='unsafe')
+			np.multiply(scaled, self.nbins / (self.xhigh - self.xlow), out=scaled)
+			if flag_outside:
+				np.copyto(scaled, 0., where=outside)
+			np.copyto(index, scaled, casting='unsafe')
+			np.take(self.edges, index, out=edge, mode='clip')
+			np.less(arr, edge, out=mask)
+			np.subtract(index, 1, out=index, where=mask)
+			np.add(index, 1, out=index1)
+			np.take(self.edges, index1, out=edge, mode='clip')
+			np.greater_equal(arr, edge, out=mask)
+			np.add(index, 1, out=index, where=mask)
+		np.minimum(index, self.nbins - 1, out=index) # x == xhigh
+		if flag_outside:
+			np.copyto(index, self.nbins, where=outside)
+		return index 
+
+	def fill_block(self, arr, weights=None):
+		index = self.get_block_index(arr)
+		if weights is None:
+			counts = np.bincount(index, minlength=self.nbins+1)[:self.nbins]
+			self.hist += counts 
+			if self.sumw2 is not None:
+				self.sumw2 += counts 
+		else:
+			weights2 = np.multiply(weights, weights, out=self.buffers.weights2[:len(weights)])
+			self.hist += np.bincount(index, weights=weights, minlength=self.nbins+1)[:self.nbins]
+			self.sumw2 += np.bincount(index, weights=weights2, minlength=self.nbins+1)[:self.nbins]
 
-	def fill(self, arr):
-		#print(arr)
-		hist, edges = np.histogram(arr, bins=self.nbins, range=(self.xlow, self.xhigh))
-		self.hist += hist
-		self.err = np.sqrt(self.hist)
+	@property
+	def err(self):
+		return np.sqrt(self.hist if self.sumw2 is None else self.sumw2)
+
+	def is_compatible(self, other):
+		return self.nbins == other.nbins and self.xlow == other.xlow and self.xhigh == other.xhigh 
+
+	def merge(self, other):
+		""" add the contents of a histogram of the same bins """
+		if not self.is_compatible(other):
+			raise ValueError('histograms of different bins: (%d, %s, %s) and (%d, %s, %s)' % (
+				self.nbins,self.xlow,self.xhigh,other.nbins,other.xlow,other.xhigh))
+		if other.sumw2 is not None or self.sumw2 is not None:
+			if self.sumw2 is None:
+				self.hist = self.hist.astype(np.float64)
+				self.sumw2 = self.hist.copy()
+			self.sumw2 += other.hist if other.sumw2 is None else other.sumw2
+		self.hist += other.hist
+		return self 
+
+	def copy(self):
+		hist = Hist1D(self.nbins, self.xlow, self.xhigh)
+		hist.hist = self.hist.copy()
+		hist.sumw2 = None if self.sumw2 is None else self.sumw2.copy()
+		return hist 
+
+	def __iadd__(self, other):
+		return self.merge(other)
+
+	def __add__(self, other):
+		return self.copy().merge(other)
 
 	@property
 	def data(self):
 		return self.bins, self.hist
 
+class BandCounts(object):
+	"""
+	Counts of the events in nbins uniform time bins (xlow <= time <= xhigh, as 
+	Hist1D) x the pha intervals between the cuts (pha < cuts[0], cuts[0] <= pha 
+	< cuts[1], ...), filled chunk by chunk. The light curve of a pha band is 
+	the difference of two columns of the cumulative counts over the intervals.
+	"""
+	def __init__(self, nbins, xlow, xhigh, cuts):
+		self.nbins = int(nbins)
+		self.xlow = xlow
+		self.xhigh = xhigh
+		self.cuts = sorted(cuts)
+		self.edges = np.linspace(xlow, xhigh, self.nbins + 1)
+		self.counts = np.zeros((self.nbins, len(self.cuts) + 1), dtype=np.int64)
+
+	def fill(self, time, pha):
+		for start in range(0, len(time), HIST_BLOCK):
+			x = time[start:start+HIST_BLOCK]
+			y = pha[start:start+HIST_BLOCK]
+			keep = np.logical_and(x >= self.xlow, x <= self.xhigh)
+			if not keep.all():
+				x = x[keep]
+				y = y[keep]
+			index = bin_index_in_range(x, self.nbins, self.xlow, self.xhigh, self.edges) * (len(self.cuts) + 1)
+			index += np.searchsorted(self.cuts, y, side='right')
+			self.counts += np.bincount(index, minlength=self.counts.size).reshape(self.counts.shape)
+
+	def get_curve(self, pha_min=None, pha_stop=None):
+		""" counts of pha_min <= pha < pha_stop (None for no limit) in each time bin, 
+		pha_min and pha_stop are in the cuts """
+		istart = 0 if pha_min == None else self.cuts.index(pha_min) + 1 
+		istop = len(self.cuts) + 1 if pha_stop == None else self.cuts.index(pha_stop) + 1 
+		return self.counts[:,istart:istop].sum(axis=1)
+
 ##########################
 # Pipeline archive
 ##########################
@@ -133,13 +348,33 @@ class Archive(object):
 		print("[Archive %s] process index of %s" % (self.param['archive_name'],index))
 
 		csvpath = self.df.iloc[index]['csvpath']
-		evt = EventFile(csvpath)
+		# the packed event file (convert_event_csv_to_npy) is used when it is up to date 
+		event_path = get_event_npy_path(csvpath)
+		if not os.path.exists(event_path) or os.path.getmtime(event_path) < os.path.getmtime(csvpath):
+			event_path = csvpath 
+		# event_chunksize: events read at once, not to load large files (default: whole file)
+		evt = EventFile(event_path,chunksize=self.param.get('event_chunksize',None))
 
 		outdir = '%s/product/id%s/%s/%s/%s/%s' % (self.param['outdir'],evt.detid, evt.year, evt.month, evt.day, evt.hour)
 
 		# make directory 
 		evt.mkdir(outdir)
 
+		# all the histograms below in one pass over the events 
+		tmin = self.param['plot_energy_sorted_curves_tmin']
+		tmax = self.param['plot_energy_sorted_curves_tmax']
+		search_burst_band = [self.param['search_burst_pha_min'],self.param['search_burst_pha_max']]
+		evt.prepare(
+			pha_spectrum=(self.param['plot_pha_spectrum_nbin'],
+				self.param['plot_pha_spectrum_min'],self.param['plot_pha_spectrum_max']),
+			curves_list=[
+				(self.param['plot_energy_sorted_curves_tbin'],tmin,tmax,
+					list(self.param['plot_energy_sorted_curves_bands'])),
+				(self.param['search_burst_tbin'],0.0,3600.,[search_burst_band]),
+				(self.param['search_burst_tbin'],tmin,tmax,[search_burst_band]),
+				(self.param['burst_alert_tbin'],tmin,tmax,
+					[[self.param['burst_alert_pha_min'],self.param['burst_alert_pha_max']]])])
+
 		# draw spectrum
 		pha_spectrum_pdf = evt.plot_pha_spectrum(
 			pha_min=self.param['plot_pha_spectrum_min'],
@@ -168,7 +403,9 @@ class Archive(object):
 			hist_min=self.param['search_burst_hist_min'],
 			hist_max=self.param['search_burst_hist_max'],
 			hist_nbin=self.param['search_burst_hist_nbin'],
-			threshold_sigma=self.param['search_burst_threshold_sigma'])
+			threshold_sigma=self.param['search_burst_threshold_sigma'],
+			method=self.param.get('search_burst_method','clip'),
+			flag_minos=self.param.get('search_burst_minos',False))
 		bstlc_pdf = evt.plot_curve(
 			tbin=self.param['search_burst_tbin'],
 			tmin=self.param['plot_energy_sorted_curves_tmin'],
@@ -212,24 +449,95 @@ class Archive(object):
 
 		self.df.drop(['csvpath','csvfile','lcfile','phafile','bstlcfile','bstdistfile','bstalert_file'],axis=1).to_html('%s/%s.html' % (self.param['outdir'],self.param['archive_name']), render_links=True, escape=False)
 
+EVENT_COLUMNS = ['minuite','seconds','100microseconds','pha']
+
+# the time of the events in 100 microsecond ticks from the hour (uint32), 
+# and the pha of the events (uint16)
+TICKS_PER_SEC = 10000 
+
+def to_ticks(minuite, seconds, microseconds100):
+	ticks = np.asarray(minuite, dtype=np.uint32) * np.uint32(60 * TICKS_PER_SEC)
+	ticks += np.asarray(seconds, dtype=np.uint32) * np.uint32(TICKS_PER_SEC)
+	ticks += np.asarray(microseconds100, dtype=np.uint32)
+	return ticks 
+
+# packed binary event file, 6 bytes per event instead of ~14-20 bytes of text 
+EVENT_DTYPE = np.dtype([('ticks','<u4'),('pha','<u2')])
+
+def get_event_npy_path(csvpath):
+	return '%s.npy' % os.path.splitext(csvpath)[0]
+
+def count_lines(file_path, blocksize=2**24):
+	nlines = 0
+	last = b'\n'
+	with open(file_path,'rb') as reader:
+		for block in iter(lambda: reader.read(blocksize), b''):
+			nlines += block.count(b'\n')
+			last = block[-1:]
+	return nlines + (0 if last == b'\n' else 1)
+
+def convert_event_csv_to_npy(csvpath, npypath=None, chunksize=10**6):
+	""" write the events of a csv file to a structured npy file of EVENT_DTYPE, 
+	chunk by chunk, which EventFile opens memory-mapped """
+	sys.stdout.write('----- {} -----\n'.format(sys._getframe().f_code.co_name))
+	if npypath is None:
+		npypath = get_event_npy_path(csvpath)
+	tmppath = '%s.tmp%d.npy' % (os.path.splitext(npypath)[0],os.getpid())
+	nlines = count_lines(csvpath) # blank lines are not events, so it may be more
+	events = np.lib.format.open_memmap(tmppath, mode='w+', dtype=EVENT_DTYPE, shape=(nlines,))
+	nevents = 0
+	for ticks, pha in EventFile(csvpath,chunksize=chunksize).iter_events():
+		events['ticks'][nevents:nevents+len(ticks)] = ticks 
+		events['pha'][nevents:nevents+len(pha)] = pha 
+		nevents += len(ticks)
+	events.flush()
+	del events 
+	if nevents < nlines:
+		# trimmed into another temporary file, renamed as the other one 
+		trimpath = '%s.tmp%d.trim.npy' % (os.path.splitext(npypath)[0],os.getpid())
+		np.save(trimpath, np.load(tmppath, mmap_mode='r')[:nevents])
+		os.remove(tmppath)
+		tmppath = trimpath 
+	os.replace(tmppath, npypath)
+	print("%s --> %s (%d events)" % (csvpath,npypath,nevents))
+	return npypath 
+
 class EventFile(object):
-	def __init__(self, file_path):
+	def __init__(self, file_path, chunksize=None):
+		""" file_path: csv file, or npy file of convert_event_csv_to_npy, which is 
+		memory-mapped instead of loaded. chunksize: number of events read at once 
+		in the streaming mode, where the events are not kept and fill the 
+		accumulators chunk by chunk, so that the memory does not depend on the 
+		file size (None to load the whole file) """
 		self.file_path = file_path
 		self.basename = os.path.splitext(os.path.basename(self.file_path))[0]
+		self.chunksize = chunksize 
 
 		if not os.path.exists(self.file_path):
 			raise FileNotFoundError("{} not found".format(self.file_path))
-		try:
-			self.df = pd.read_csv('%s' % self.file_path,
-				header=None,
-				names=['minuite','seconds','100microseconds','pha'])
-		except OSError as e:
-			raise
-
-		self.format = 'csv'
-		self.nevents = len(self.df)		
 
-		self.df['time_sec'] = self.df['minuite'] * 60.0 + self.df['seconds'] + self.df['100microseconds'] * 1/10000
+		self.format = 'npy' if os.path.splitext(self.file_path)[1] == '.npy' else 'csv'
+		# 2-D (time x pha) counts of get_band_curves for each (tbin, tmin, tmax)
+		self.curve_cache = {}
+		self.pha_spectrum = None 
+
+		self.df = None 
+		self.events = None 
+		self.nevents = None # counted in the first pass of the streaming mode 
+		if self.format == 'npy':
+			# only the header is read here, the pages are read when the events are binned
+			self.events = np.load(self.file_path, mmap_mode='r')
+			if self.events.dtype != EVENT_DTYPE:
+				raise ValueError("{} is not an event file of {}".format(self.file_path,EVENT_DTYPE))
+			self.nevents = len(self.events)
+		elif self.chunksize is None:
+			try:
+				self.df = pd.read_csv('%s' % self.file_path,
+					header=None,
+					names=EVENT_COLUMNS)
+			except OSError as e:
+				raise
+			self.nevents = len(self.df)		
 
 		self.detid, self.yyyymmdd, self.hour = self.basename.split("_")
 
@@ -245,6 +553,59 @@ class EventFile(object):
 		cmd = 'mkdir -p %s' % self.outdir 
 		print(cmd);os.system(cmd)
 
+	def iter_events(self):
+		""" (ticks, pha) arrays of the events: all of them at once, or chunk by 
+		chunk in the streaming mode """
+		if self.events is not None:
+			step = self.chunksize if self.chunksize is not None else max(self.nevents,1)
+			for start in range(0, self.nevents, step):
+				# contiguous copies of the packed fields of the chunk
+				chunk = self.events[start:start+step]
+				yield np.ascontiguousarray(chunk['ticks']), np.ascontiguousarray(chunk['pha'])
+			return 
+		if self.df is not None:
+			yield (to_ticks(self.df['minuite'],self.df['seconds'],self.df['100microseconds']),
+				self.df['pha'].to_numpy(dtype=np.uint16))
+			return 
+		nevents = 0
+		reader = pd.read_csv(self.file_path,header=None,names=EVENT_COLUMNS,
+			dtype=np.int32,chunksize=self.chunksize)
+		for chunk in reader:
+			nevents += len(chunk)
+			yield (to_ticks(chunk['minuite'],chunk['seconds'],chunk['100microseconds']),
+				chunk['pha'].to_numpy(dtype=np.uint16))
+		self.nevents = nevents 
+
+	def accumulate(self,hists=[],band_counts=[]):
+		""" fill the pha histograms (Hist1D) and the BandCounts in one pass over the events """
+		sys.stdout.write('----- {} -----\n'.format(sys._getframe().f_code.co_name))
+		for ticks, pha in self.iter_events():
+			for hist in hists:
+				hist.fill(pha)
+			for counts in band_counts:
+				counts.fill(ticks,pha)
+
+	def prepare(self,pha_spectrum=None,curves_list=[]):
+		""" 
+		bin the events for the following plots and searches in a single pass, 
+		which matters in the streaming mode: pha_spectrum is (pha_nbin, pha_min, 
+		pha_max) of plot_pha_spectrum, curves_list the (tbin, tmin, tmax, 
+		pha_bands_list) of the light curves.
+		"""
+		hists = []
+		if pha_spectrum is not None:
+			pha_nbin, pha_min, pha_max = pha_spectrum
+			self.pha_spectrum = Hist1D(nbins=pha_nbin,xlow=pha_min,xhigh=pha_max)
+			hists.append(self.pha_spectrum)
+		cuts_dict = {}
+		for tbin, tmin, tmax, pha_bands_list in curves_list:
+			cuts_dict.setdefault((tbin,tmin,tmax),set()).update(self.get_pha_cuts(pha_bands_list))
+		band_counts = []
+		for (tbin, tmin, tmax), cuts in cuts_dict.items():
+			self.curve_cache[(tbin,tmin,tmax)] = self.new_band_counts(tbin,tmin,tmax,cuts)
+			band_counts.append(self.curve_cache[(tbin,tmin,tmax)])
+		self.accumulate(hists,band_counts)
+
 	def plot_pha_spectrum(self,pha_min=0,pha_max=2**10,pha_nbin=2**9,xmin=15,xmax=2**10):
 		sys.stdout.write('----- {} -----\n'.format(sys._getframe().f_code.co_name))
 	
@@ -254,8 +615,9 @@ class EventFile(object):
 		#	range=(pha_min,pha_max),bins=pha_nbin,histtype='step')
 		#x = 0.5*(xedges[1:] + xedges[:-1])
 
-		self.pha_spectrum = Hist1D(nbins=pha_nbin,xlow=pha_min,xhigh=pha_max)
-		self.pha_spectrum.fill(self.df['pha'])
+		if self.pha_spectrum is None or not self.pha_spectrum.is_compatible(Hist1D(pha_nbin,pha_min,pha_max)):
+			self.pha_spectrum = Hist1D(nbins=pha_nbin,xlow=pha_min,xhigh=pha_max)
+			self.accumulate(hists=[self.pha_spectrum])
 
 		fig, ax = plt.subplots(1,1, figsize=(11.69,8.27))
 		plt.errorbar(
@@ -285,41 +647,66 @@ class EventFile(object):
 		print(outpdf)
 		return outpdf 
 
+	def get_pha_cuts(self,pha_bands_list):
+		""" pha_min and pha_max + 1 of the bands (the pha are integer channels) """
+		cuts = set()
+		for pha_min, pha_max in pha_bands_list:
+			pha_min = to_pha_limit(pha_min)
+			pha_max = to_pha_limit(pha_max)
+			if pha_min != None:
+				cuts.add(int(pha_min))
+			if pha_max != None:
+				cuts.add(int(pha_max) + 1)
+		return cuts 
+
+	def new_band_counts(self,tbin,tmin,tmax,cuts):
+		# time bins in ticks
+		return BandCounts(round((tmax-tmin)/tbin),tmin*TICKS_PER_SEC,tmax*TICKS_PER_SEC,cuts)
+
+	def get_band_counts(self,tbin,tmin,tmax,cuts):
+		""" BandCounts of the events for (tbin, tmin, tmax) with the pha cuts, kept in 
+		curve_cache; the events are binned again (with the cuts so far) for a new cut """
+		key = (tbin,tmin,tmax)
+		band_counts = self.curve_cache.get(key)
+		if band_counts is not None and set(cuts) <= set(band_counts.cuts):
+			return band_counts 
+		if band_counts is not None:
+			cuts = set(cuts) | set(band_counts.cuts)
+		band_counts = self.new_band_counts(tbin,tmin,tmax,cuts)
+		self.accumulate(band_counts=[band_counts])
+		self.curve_cache[key] = band_counts 
+		return band_counts 
+
+	def get_band_curves(self,tbin=1.0,tmin=0.0,tmax=3600.,
+		pha_bands_list=[[None,None]]):
+		"""
+		light curves (Hist1D) and suffixes of the pha bands (pha_min <= pha <= pha_max, 
+		None for no limit, the bands may overlap), all from one binning of the 
+		events in time and pha, which is reused for the same (tbin, tmin, tmax).
+		"""
+		band_counts = self.get_band_counts(tbin,tmin,tmax,self.get_pha_cuts(pha_bands_list))
+
+		lchist_list = []
+		suffix_list = []
+		for pha_min, pha_max in pha_bands_list:
+			pha_min = to_pha_limit(pha_min)
+			pha_max = to_pha_limit(pha_max)
+			hist_lc = Hist1D(band_counts.nbins, tmin, tmax)
+			hist_lc.hist += band_counts.get_curve(None if pha_min == None else int(pha_min),
+				None if pha_max == None else int(pha_max) + 1)
+			lchist_list.append(hist_lc)
+			suffix_list.append(get_pha_suffix(pha_min,pha_max))
+			print("%s: %d events in %.1f-%.1f sec (%.2f%%)" % (suffix_list[-1],hist_lc.hist.sum(),tmin,tmax,
+				float(hist_lc.hist.sum())/float(max(self.nevents,1))*100.0))
+		return lchist_list, suffix_list
+
 	def extract_curve(self,tbin=1.0,tmin=0.0,tmax=3600.,
 		pha_min=None,pha_max=None):
 		sys.stdout.write('----- {} -----\n'.format(sys._getframe().f_code.co_name))
 
-		if pha_min == 'None':
-			pha_min = None
-		if pha_max == 'None':
-			pha_max = None
-
-		print(pha_min,pha_max)
-		if pha_min == None and pha_max == None:
-			print("no pha selection.")
-			suffix = 'pha_all' 
-			mask = np.full(len(self.df), True)
-		elif pha_min != None and pha_max == None:
-			print("%d <= pha" % pha_min)	
-			suffix = 'pha_%d_xx'	% (pha_min)								
-			mask = (self.df['pha'] >= pha_min)
-		elif pha_min == None and pha_max != None:
-			print("pha <= %d" % pha_max)				
-			suffix = 'pha_xx_%d' % (pha_max)		
-			mask = (self.df['pha'] <= pha_max)
-		elif pha_min != None and pha_max != None:
-			print("%d <= pha <= %d" % (pha_min,pha_max))
-			suffix = 'pha_%d_%d'	% (pha_min,pha_max)			
-			mask = np.logical_and((self.df['pha'] >= pha_min),(self.df['pha'] <= pha_max))
-
-		print("%d --> %d (%.2f%%)" % (len(self.df),len(self.df[mask]),
-			float(len(self.df[mask]))/float(len(self.df))*100.0))
-
-		nbins = round((tmax-tmin)/tbin)
-		hist_lc = Hist1D(nbins, tmin, tmax)
-		#print(self.df['TIME'][mask]-self.df['time_sec'][0])
-		hist_lc.fill(self.df['time_sec'][mask])
-		return hist_lc,suffix
+		lchist_list, suffix_list = self.get_band_curves(tbin=tbin,tmin=tmin,tmax=tmax,
+			pha_bands_list=[[pha_min,pha_max]])
+		return lchist_list[0], suffix_list[0]
 
 	def plot_energy_sorted_curves(self,tbin=1.0,tmin=0.0,tmax=3600.,
 		pha_bands_list=[[None,30],[30,100],[100,300],[300,None]]):
@@ -327,19 +714,9 @@ class EventFile(object):
 
 		outpdf = '%s/%s_curves.pdf' % (self.outdir,self.basename)
 
-		lchist_list = []
-		suffix_list = []
-		for pha_bands in pha_bands_list:
-			pha_min, pha_max = pha_bands
-			if pha_min == 'None':
-				pha_min = None
-			if pha_max == 'None':
-				pha_max = None
-			lchist,suffix = self.extract_curve(tbin=tbin,
-				tmin=tmin,tmax=tmax,
-				pha_min=pha_min,pha_max=pha_max)				
-			lchist_list.append(lchist)
-			suffix_list.append(suffix)
+		# all the bands from one binning of the events
+		lchist_list, suffix_list = self.get_band_curves(tbin=tbin,
+			tmin=tmin,tmax=tmax,pha_bands_list=pha_bands_list)
 
 		fig, axs = plt.subplots(len(pha_bands_list),1, figsize=(8.27,11.69), 
 			sharex=True, gridspec_kw={'hspace': 0})
@@ -435,7 +812,14 @@ class EventFile(object):
 	def search_burst(self,tbin=16.0,tmin=0.0,tmax=3600.,
 			pha_min=100,pha_max=None,
 			hist_min=0,hist_max=2046,hist_nbin=512,
-			threshold_sigma=3.0):
+			threshold_sigma=3.0,method='clip',clip_sigma=2.0,flag_minos=False):
+		"""
+		bins of the light curve above mu + threshold_sigma * sigma of the rate 
+		distribution. method='clip' (default) estimates mu and sigma by sigma 
+		clipping of the rates (estimate_gauss_clipped); method='minuit' fits a 
+		Gaussian to the rate histogram with iminuit and probfit, and runs MINOS 
+		for the errors only with flag_minos.
+		"""
 		sys.stdout.write('----- {} -----\n'.format(sys._getframe().f_code.co_name))
 
 		outpdf = '%s/%s_search_burst_hist.pdf' % (self.outdir,self.basename)
@@ -450,35 +834,51 @@ class EventFile(object):
 
 		hist_rate_dist = Hist1D(int(hist_nbin),hist_min,hist_max)
 		hist_rate_dist.fill(lchist.hist)
-
-		fit_range_min = np.mean(lchist.hist) - 3.0 * np.std(lchist.hist)
-		fit_range_max = np.mean(lchist.hist) + 3.0 * np.std(lchist.hist)	
-		#print(fit_range_min,fit_range_max)
-		mask_fit = np.logical_and(
-			hist_rate_dist.bins>=fit_range_min,
-			hist_rate_dist.bins<=fit_range_max)
 		mask_data_exists = (hist_rate_dist.err > 0.0)
 
-		chi2reg = Chi2Regression(model_gauss,
-			hist_rate_dist.bins[mask_fit],hist_rate_dist.hist[mask_fit])
-		fit = Minuit(chi2reg, 
-			mu=np.mean(lchist.hist),
-			sigma=np.std(lchist.hist),
-			area=sum(hist_rate_dist.hist[mask_fit]),
-			limit_mu=(0,None),
-			limit_sigma=(0,None),
-			limit_area=(0,None)
-			)
-		fit.migrad()
-		fit.minos() 
-		print(fit.print_param())
-		print(fit.values)
-		print(fit.errors)
-		bestfit = fit.values
+		if method == 'minuit':
+			from iminuit import Minuit
+			from probfit import Chi2Regression
+
+			fit_range_min = np.mean(lchist.hist) - 3.0 * np.std(lchist.hist)
+			fit_range_max = np.mean(lchist.hist) + 3.0 * np.std(lchist.hist)	
+			#print(fit_range_min,fit_range_max)
+			mask_fit = np.logical_and(
+				hist_rate_dist.bins>=fit_range_min,
+				hist_rate_dist.bins<=fit_range_max)
+
+			chi2reg = Chi2Regression(model_gauss,
+				hist_rate_dist.bins[mask_fit],hist_rate_dist.hist[mask_fit])
+			fit = Minuit(chi2reg, 
+				mu=np.mean(lchist.hist),
+				sigma=np.std(lchist.hist),
+				area=sum(hist_rate_dist.hist[mask_fit]),
+				limit_mu=(0,None),
+				limit_sigma=(0,None),
+				limit_area=(0,None)
+				)
+			fit.migrad()
+			if flag_minos:
+				fit.minos() 
+			print(fit.print_param())
+			bestfit = fit.values
+			errors = fit.errors 
+		elif method == 'clip':
+			mu, sigma, nclip = estimate_gauss_clipped(lchist.hist, nsigma=clip_sigma)
+			# the area of model_gauss on the rate histogram
+			hist_bin_width = (hist_max - hist_min) / float(hist_nbin)
+			bestfit = {'mu':float(mu), 'sigma':float(sigma), 'area':nclip * hist_bin_width}
+			errors = {'mu':float(sigma / np.sqrt(max(nclip,1))), 
+				'sigma':float(sigma / np.sqrt(2.0 * max(nclip - 1,1))),
+				'area':float(np.sqrt(nclip) * hist_bin_width)}
+		else:
+			raise ValueError('unknown method of search_burst: {} (clip or minuit)'.format(method))
+		print(bestfit)
+		print(errors)
 
 		f = open(outtxt,'w')
-		f.write(str(fit.values)+'\n')
-		f.write(str(fit.errors))
+		f.write(str(bestfit)+'\n')
+		f.write(str(errors))
 		f.close()
 
 		fig = plt.figure(figsize=(7,6))
@@ -543,7 +943,7 @@ class EventFile(object):
 		print(lchist.bins[mask_burst_candidates])
 		print(lchist.hist[mask_burst_candidates])		
 
-		return outpdf, fit.values, fit.errors, mask_burst_candidates
+		return outpdf, bestfit, errors, mask_burst_candidates
 
 	def burst_alert(self,tbin=20.0,tmin=0.0,tmax=3600.,
 		pha_min=None,pha_max=None,runave_width=15,runave_threshold=3.0):
@@ -611,14 +1011,23 @@ class EventFile(object):
 # MAIN PROCESS
 ################################
 
-cogamo_archive = Archive('setenv/parameter.yaml')
-cogamo_archive.set_csvfiles()
-cogamo_archive.convert_to_dataframe()
-#cogamo_archive.process(1)
-#cogamo_archive.process(307)
-#cogamo_archive.process(308)
-#cogamo_archive.write()
-#exit()
-for index in range(len(cogamo_archive.df)):
-	cogamo_archive.process(index)
-	cogamo_archive.write()
+def main():
+	cogamo_archive = Archive('setenv/parameter.yaml')
+	cogamo_archive.set_csvfiles()
+	cogamo_archive.convert_to_dataframe()
+	#cogamo_archive.process(1)
+	#cogamo_archive.process(307)
+	#cogamo_archive.process(308)
+	#cogamo_archive.write()
+	#exit()
+	for index in range(len(cogamo_archive.df)):
+		cogamo_archive.process(index)
+		cogamo_archive.write()
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1 and sys.argv[1] == 'convert':
+		# pipeline.py convert csvfile [csvfile ...]: packed npy event files next to the csv files
+		for csvpath in sys.argv[2:]:
+			convert_event_csv_to_npy(csvpath)
+	else:
+		main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import argparse
+
+import os
+import sys
+import time
+import importlib.util
+import numpy as np
+
+__author__ = 'Teruaki Enoto'
+__version__ = '0.01'
+
+def get_parser():
+	parser = argparse.ArgumentParser(
+		prog="bench_hist1d.py",
+		usage='%(prog)s [--nevents 2000000] [--repeat 5]',
+		description="""
+Time of Hist1D.fill of ref/pipeline.py (bin index in the reusable block
+buffers and np.bincount) against the accumulation of np.histogram of the
+same bins, for the time, pha and ticks of the events, in one large fill
+and in many small fills. The two histograms are also checked to be equal.
+"""	)
+	parser.add_argument('--nevents', '-n', type=int, default=2000000,
+		help='number of events (default: 2000000)')
+	parser.add_argument('--repeat', '-r', type=int, default=5,
+		help='number of repetitions, the best one is shown (default: 5)')
+	return parser
+
+def load_ref_pipeline():
+	""" ref/pipeline.py as a module (it is a script, not in the package) """
+	path = '%s/../ref/pipeline.py' % os.path.dirname(os.path.abspath(__file__))
+	spec = importlib.util.spec_from_file_location('ref_pipeline',path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+def fill_numpy(chunks, nbins, xlow, xhigh):
+	hist = np.zeros(nbins, dtype=np.int64)
+	for chunk in chunks:
+		hist += np.histogram(chunk, bins=nbins, range=(xlow,xhigh))[0]
+	return hist
+
+def fill_hist1d(Hist1D, chunks, nbins, xlow, xhigh):
+	hist = Hist1D(nbins, xlow, xhigh)
+	for chunk in chunks:
+		hist.fill(chunk)
+	return hist.hist
+
+def get_best_time(function, repeat):
+	best = None
+	for i in range(repeat):
+		time_start = time.perf_counter()
+		result = function()
+		elapsed = time.perf_counter() - time_start
+		best = elapsed if best is None else min(best,elapsed)
+	return best, result
+
+def get_cases(nevents):
+	""" name, chunks of the values, nbins, xlow and xhigh """
+	rng = np.random.default_rng(0)
+	time_sec = np.sort(rng.uniform(0., 3600., nevents))
+	pha = rng.integers(0, 1024, nevents).astype(np.uint16)
+	ticks = (time_sec * 1e4).astype(np.uint32)
+	small = max(nevents // 2000, 1)
+	return [
+		('time float64, 3600 bins',[time_sec],3600,0.,3600.),
+		('pha uint16, 512 bins of width 2',[pha],512,0,1024),
+		('ticks uint32, 3600 bins of 10000',[ticks],3600,0,36000000),
+		('time float64, %d small fills' % (nevents // small),np.array_split(time_sec,nevents // small),3600,0.,3600.),
+		('pha uint16, %d small fills' % (nevents // small),np.array_split(pha,nevents // small),512,0,1024),
+		]
+
+def main(args=None):
+	parser = get_parser()
+	args = parser.parse_args(args) # get arguments
+
+	ref_pipeline = load_ref_pipeline()
+	num_of_failures = 0
+	sys.stdout.write('%d events, best of %d (block of %d values)\n' % (args.nevents,args.repeat,ref_pipeline.HIST_BLOCK))
+	for name, chunks, nbins, xlow, xhigh in get_cases(args.nevents):
+		time_numpy, hist_numpy = get_best_time(lambda: fill_numpy(chunks,nbins,xlow,xhigh),args.repeat)
+		time_hist1d, hist_hist1d = get_best_time(lambda: fill_hist1d(ref_pipeline.Hist1D,chunks,nbins,xlow,xhigh),args.repeat)
+		flag_equal = np.array_equal(hist_numpy,hist_hist1d)
+		if not flag_equal:
+			num_of_failures += 1
+		sys.stdout.write('%-36s: np.histogram %7.1f ms, Hist1D %7.1f ms (x%.1f) %s\n' % (
+			name,1e3*time_numpy,1e3*time_hist1d,time_numpy/time_hist1d,'OK' if flag_equal else 'NG'))
+
+	# what is still allocated in each block: the np.bincount result only
+	hist = ref_pipeline.Hist1D(3600,0.,3600.)
+	hist.fill(np.zeros(1))
+	size_buffers = sum([array.nbytes for array in vars(hist.buffers).values()])
+	sys.stdout.write('reused buffers: %d kB per histogram, allocated per block: %d kB (np.bincount of 3600 bins)\n' % (
+		size_buffers // 1024,(hist.nbins + 1) * 8 // 1024))
+	if num_of_failures > 0:
+		sys.stderr.write('[error] Hist1D and np.histogram differ in %d cases.\n' % num_of_failures)
+		sys.exit(1)
+
+if __name__=="__main__":
+	main()
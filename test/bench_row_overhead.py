@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import argparse
+
+import os
+import sys
+import time
+import shlex
+import shutil
+import tempfile
+
+from easypipeline.pipeline import write_text_atomic
+
+__author__ = 'Teruaki Enoto'
+__version__ = '0.01'
+
+def get_parser():
+	parser = argparse.ArgumentParser(
+		prog="bench_row_overhead.py",
+		usage='%(prog)s [--rows 200] [--workdir dir] [--flag_open]',
+		description="""
+Per-row file-system overhead of the pipeline: the former shell-outs
+(rm -rf and mkdir -p of the output directory, and open of the html table)
+against the in-process calls (shutil.rmtree, os.makedirs and
+write_text_atomic of the table).
+"""	)
+	parser.add_argument('--rows', '-n', type=int, default=200,
+		help='number of rows (default: 200)')
+	parser.add_argument('--workdir', '-w', type=str, default=None,
+		help='directory of the dummy outputs (default: a temporary directory)')
+	parser.add_argument('--flag_open', action='store_true', dest='flag_open', default=False,
+		help='also time "open" of the table as the former code did (opens a browser tab per row)')
+	return parser
+
+def make_outputs(outdir):
+	""" dummy outputs of a row: a quick look plot and a cache file """
+	os.makedirs(outdir,exist_ok=True)
+	for fname in ['qlcurve.pdf','qlcurve.png']:
+		with open('%s/%s' % (outdir,fname),'wb') as writer:
+			writer.write(b'\0' * 40000)
+
+def run_shell(workdir,nrows,content,flag_open=False):
+	""" the former per-row path (the paths are quoted here, the former code did not) """
+	htmlpath = '%s/table.html' % workdir
+	time_start = time.time()
+	for index in range(nrows):
+		outdir = '%s/data/row%04d' % (workdir,index)
+		os.system('rm -rf %s' % shlex.quote(outdir))
+		os.system('mkdir -p %s' % shlex.quote(outdir))
+		with open(htmlpath,'w') as writer:
+			writer.write(content)
+		if flag_open:
+			os.system('open %s ' % shlex.quote(htmlpath))
+	return time.time() - time_start
+
+def run_inprocess(workdir,nrows,content):
+	""" the per-row path of HKData.set_outdir and PipelineTable.write """
+	htmlpath = '%s/table.html' % workdir
+	time_start = time.time()
+	for index in range(nrows):
+		outdir = '%s/data/row%04d' % (workdir,index)
+		if os.path.exists(outdir):
+			shutil.rmtree(outdir)
+		os.makedirs(outdir,exist_ok=True)
+		write_text_atomic(htmlpath,content)
+	return time.time() - time_start
+
+def main(args=None):
+	parser = get_parser()
+	args = parser.parse_args(args) # get arguments
+
+	workdir = args.workdir if args.workdir is not None else tempfile.mkdtemp(prefix='bench_row_overhead_')
+	content = '<table>\n%s</table>\n' % ('<tr><td>--</td></tr>\n' * args.rows)
+	try:
+		results = []
+		for name, function in [('shell-outs',lambda: run_shell(workdir,args.rows,content,args.flag_open)),
+				('in-process',lambda: run_inprocess(workdir,args.rows,content))]:
+			for index in range(args.rows):
+				make_outputs('%s/data/row%04d' % (workdir,index))
+			elapsed = function()
+			results.append(elapsed)
+			sys.stdout.write('%-10s: %.2f ms/row (%d rows, %.3f sec)\n' % (name,1e3*elapsed/args.rows,args.rows,elapsed))
+		sys.stdout.write('speedup   : x%.1f\n' % (results[0]/results[1]))
+	finally:
+		if args.workdir is None:
+			shutil.rmtree(workdir)
+
+if __name__=="__main__":
+	main()
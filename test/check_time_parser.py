@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import argparse
+
+import os
+import sys
+import glob
+import numpy as np
+
+import easypipeline.cogamo as cogamo
+
+__author__ = 'Teruaki Enoto'
+__version__ = '0.01'
+
+def get_parser():
+	parser = argparse.ArgumentParser(
+		prog="check_time_parser.py",
+		usage='%(prog)s [csvfile ...]',
+		description="""
+Check that the fixed-format numpy parser of the JST timestamps (the default
+of HKData) gives exactly the same unixtime and jst as the astropy parser.
+"""	)
+	parser.add_argument('csvfiles',metavar='csvfile',type=str,nargs='*',
+		default=sorted(glob.glob('%s/example001/input/data/*.csv' % os.path.dirname(os.path.abspath(__file__)))),
+		help='Input HK csvfiles (default: the files of example001).')
+	return parser
+
+def compare(csvfile):
+	""" number of the rows and of the rows whose unixtime or jst differ """
+	hk_numpy = cogamo.HKData(csvfile)
+	hk_astropy = cogamo.HKData(csvfile,time_parser='astropy')
+
+	unixtime_numpy = hk_numpy.df['unixtime'].to_numpy()
+	unixtime_astropy = hk_astropy.df['unixtime'].to_numpy()
+	# astropy Time objects of each row, compared at the microsecond
+	jst_numpy = hk_numpy.df['jst'].to_numpy().astype('datetime64[us]')
+	jst_astropy = np.array([time.datetime64 for time in hk_astropy.df['jst']]).astype('datetime64[us]')
+
+	if len(unixtime_numpy) != len(unixtime_astropy):
+		return len(unixtime_numpy), max(len(unixtime_numpy),len(unixtime_astropy))
+	mismatch = np.logical_or(unixtime_numpy != unixtime_astropy,jst_numpy != jst_astropy)
+	return len(unixtime_numpy), int(np.sum(mismatch))
+
+def main(args=None):
+	parser = get_parser()
+	args = parser.parse_args(args) # get arguments
+
+	if len(args.csvfiles) == 0:
+		parser.error('no csvfile.')
+	num_of_failures = 0
+	for csvfile in args.csvfiles:
+		nrows, nmismatch = compare(csvfile)
+		sys.stdout.write('%s: %d rows, %d mismatches %s\n' % (csvfile,nrows,nmismatch,'OK' if nmismatch == 0 else 'NG'))
+		if nmismatch > 0:
+			num_of_failures += 1
+	if num_of_failures > 0:
+		sys.stderr.write('[error] numpy and astropy time parsers differ in %d files.\n' % num_of_failures)
+		sys.exit(1)
+
+if __name__=="__main__":
+	main()